@@ -0,0 +1,123 @@
+from sqlalchemy import text, select, func, case
+from models.models import db, Product, SalesDaily, SalesProductDaily
+from inventory import STATUS_PAID, STATUS_UNPAID
+
+# Аналитика продаж по заранее агрегированным таблицам:
+#   sales_daily         - день создания заказа и статус: число заказов и единиц товара;
+#   sales_product_daily - день и товар: заказанное количество.
+# Таблицы обновляются триггерами в той же транзакции, что и создание заказа,
+# оплата (смена статуса) и удаление заказов/позиций, поэтому отчет за год
+# читает сотни строк сводок, а не все позиции заказов. День - дата создания
+# заказа в UTC (как хранится created_at). Пересчет по текущим данным -
+# "python database.py rebuild-analytics".
+
+def _daily(day, status, orders, units, source='WHERE true'):
+    # WHERE обязателен: без него SQLite не отличит ON CONFLICT от условия соединения
+    return (f"INSERT INTO sales_daily(day, status, orders, units) "
+            f"SELECT {day}, {status}, {orders}, {units} {source} "
+            f"ON CONFLICT(day, status) DO UPDATE SET "
+            f"orders = orders + excluded.orders, units = units + excluded.units;")
+
+def _product_daily(select_sql):
+    return (f"INSERT INTO sales_product_daily(day, product_id, quantity) {select_sql} "
+            f"ON CONFLICT(day, product_id) DO UPDATE SET quantity = quantity + excluded.quantity;")
+
+def _item(row, sign):
+    # Позиция учитывается, только пока существует ее заказ: при удалении
+    # заказа раньше позиций их количество вычитает триггер удаления заказа
+    source = f'FROM "order" o WHERE o.id = {row}.order_id'
+    return (_daily("date(o.created_at)", "COALESCE(o.status, '')", 0, f"{sign}{row}.quantity", source)
+            + _product_daily(f"SELECT date(o.created_at), {row}.product_id, {sign}{row}.quantity {source}"))
+
+def _order_units(row):
+    return f"COALESCE((SELECT SUM(quantity) FROM order_item WHERE order_id = {row}.id), 0)"
+
+ANALYTICS_SCHEMA = [
+    f"""CREATE TRIGGER IF NOT EXISTS analytics_order_insert AFTER INSERT ON "order" BEGIN
+        {_daily("date(NEW.created_at)", "COALESCE(NEW.status, '')", 1, 0)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS analytics_order_status AFTER UPDATE OF status ON "order"
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        {_daily("date(NEW.created_at)", "COALESCE(OLD.status, '')", -1, '-' + _order_units('NEW'))}
+        {_daily("date(NEW.created_at)", "COALESCE(NEW.status, '')", 1, _order_units('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS analytics_order_delete AFTER DELETE ON "order" BEGIN
+        {_daily("date(OLD.created_at)", "COALESCE(OLD.status, '')", -1, '-' + _order_units('OLD'))}
+        {_product_daily('SELECT date(OLD.created_at), product_id, -SUM(quantity) FROM order_item '
+                        'WHERE order_id = OLD.id GROUP BY product_id')}
+    END""",
+    f"CREATE TRIGGER IF NOT EXISTS analytics_item_insert AFTER INSERT ON order_item BEGIN {_item('NEW', '')} END",
+    f"CREATE TRIGGER IF NOT EXISTS analytics_item_delete AFTER DELETE ON order_item BEGIN {_item('OLD', '-')} END",
+    f"""CREATE TRIGGER IF NOT EXISTS analytics_item_update AFTER UPDATE OF order_id, product_id, quantity ON order_item
+    BEGIN {_item('OLD', '-')} {_item('NEW', '')} END""",
+]
+
+def install():
+    """Создает триггеры; если сводок еще нет, считает их по текущим данным (без commit)"""
+    for statement in ANALYTICS_SCHEMA:
+        db.session.execute(text(statement))
+    if db.session.query(SalesDaily.day).first() is None:
+        rebuild()
+
+def rebuild():
+    """Пересчитывает сводки полным проходом по заказам (без commit)"""
+    db.session.execute(text("DELETE FROM sales_daily"))
+    db.session.execute(text("DELETE FROM sales_product_daily"))
+    db.session.execute(text("""
+        INSERT INTO sales_daily(day, status, orders, units)
+        SELECT date(o.created_at), COALESCE(o.status, ''), COUNT(*), COALESCE(SUM(i.units), 0)
+        FROM "order" o
+        LEFT JOIN (SELECT order_id, SUM(quantity) AS units FROM order_item GROUP BY order_id) i
+            ON i.order_id = o.id
+        GROUP BY 1, 2
+    """))
+    db.session.execute(text("""
+        INSERT INTO sales_product_daily(day, product_id, quantity)
+        SELECT date(o.created_at), i.product_id, SUM(i.quantity)
+        FROM order_item i JOIN "order" o ON o.id = i.order_id
+        GROUP BY 1, 2
+    """))
+
+def _period_key(period):
+    if period == 'week':
+        # Понедельник недели, в которую попадает день
+        return func.date(SalesDaily.day, 'weekday 0', '-6 days')
+    return SalesDaily.day
+
+def order_volume(start, end, period='day'):
+    """Заказы и единицы товара по дням или неделям, всего и по статусам"""
+    key = _period_key(period).label('period')
+
+    def by_status(column, status):
+        return func.sum(case((SalesDaily.status == status, column), else_=0))
+
+    query = select(
+        key,
+        func.sum(SalesDaily.orders), func.sum(SalesDaily.units),
+        by_status(SalesDaily.orders, STATUS_PAID), by_status(SalesDaily.orders, STATUS_UNPAID),
+        by_status(SalesDaily.units, STATUS_PAID), by_status(SalesDaily.units, STATUS_UNPAID),
+    ).where(SalesDaily.day >= start.isoformat(), SalesDaily.day <= end.isoformat()) \
+        .group_by(key).order_by(key)
+
+    return [
+        {'period': period_start, 'orders': orders, 'units': units,
+         'paid_orders': paid_orders, 'unpaid_orders': unpaid_orders,
+         'paid_units': paid_units, 'unpaid_units': unpaid_units}
+        for period_start, orders, units, paid_orders, unpaid_orders, paid_units, unpaid_units
+        in db.session.execute(query)
+        if orders or units
+    ]
+
+def top_products(start, end, limit=10):
+    """Товары с наибольшим заказанным количеством за период"""
+    total = func.sum(SalesProductDaily.quantity).label('quantity')
+    ranked = select(SalesProductDaily.product_id, total) \
+        .where(SalesProductDaily.day >= start.isoformat(), SalesProductDaily.day <= end.isoformat()) \
+        .group_by(SalesProductDaily.product_id) \
+        .having(total > 0) \
+        .order_by(total.desc(), SalesProductDaily.product_id) \
+        .limit(limit).subquery()
+    query = select(ranked.c.product_id, Product.article, Product.name, ranked.c.quantity) \
+        .outerjoin(Product, Product.id == ranked.c.product_id) \
+        .order_by(ranked.c.quantity.desc(), ranked.c.product_id)
+    return [dict(row._mapping) for row in db.session.execute(query)]
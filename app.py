@@ -1,231 +1,256 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, session, jsonify, flash
 from models.models import db, User, Product, Order, OrderItem
 from config import Config
+from inventory import (load_products, add_order_lines, pay_order, pay_orders, create_order_by_articles,
+                       StockShortage, UnknownArticles, STATUS_PAID, STATUS_UNPAID,
+                       PAYMENT_PAID, PAYMENT_ALREADY_PAID, PAYMENT_NOT_FOUND, PAYMENT_SHORTAGE)
+import cart as cart_store
+import search
+import stats
+import catalog
+import fragment_cache
+import idempotency
+import events
+import ledger
+import analytics
+import migrations
+import importer
+import user_cache
+import db_tuning
+import metrics
+import logs
+from user_cache import current_user
+import io
+from sqlalchemy import func, distinct, case, select, delete
+from sqlalchemy.orm import selectinload, undefer
+from markupsafe import Markup
 import re
+import json
+import base64
+from datetime import date, datetime, timedelta, timezone
 from functools import wraps
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
+logger = logging.getLogger(__name__)
 
-# Автоматическая инициализация БД с тестовыми данными
+# Все маршруты приложения; регистрируются в create_app()
+bp = Blueprint('main', __name__)
+
+def create_app(config=Config):
+    """Создает приложение. К базе данных при этом не обращается: схема и
+    тестовые данные создаются явно командой init-db (flask или database.py)."""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    logs.init_app(app)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_tuning.engine_options(app.config)
+    db.init_app(app)
+    db_tuning.init_app(app, db)
+    metrics.init_app(app, db)
+    app.register_blueprint(bp)
+    
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Применить миграции и создать тестовые данные в пустой базе"""
+        init_database()
+    
+    return app
+
+def __getattr__(name):
+    # Совместимость с WSGI-конфигурациями вида "from app import app":
+    # приложение создается при первом обращении
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Инициализация БД с тестовыми данными (в контексте приложения)
 def init_database():
     """Проверяет и инициализирует базу данных"""
-    with app.app_context():
-        try:
-            # Создаем таблицы, если их нет
-            db.create_all()
+    try:
+        # Создаем таблицы и применяем недостающие миграции схемы
+        migrations.upgrade()
+        
+        # Проверяем, есть ли пользователи в базе
+        user_count = User.query.count()
+        product_count = Product.query.count()
+        
+        # Если база пуста (нет пользователей), создаем тестовые данные
+        if user_count == 0:
+            logger.info('База данных пуста, создаю тестовые данные')
             
-            # Проверяем, есть ли пользователи в базе
-            user_count = User.query.count()
-            product_count = Product.query.count()
+            # Создаем тестовых пользователей
+            users = [
+                ("admin", "storekeeper123", "admin"),
+                ("ivanov", "password123", "storekeeper"),
+                ("petrov", "secure456", "storekeeper"),
+                ("sidorov", "test789", "storekeeper"),
+                ("manager", "manager123", "storekeeper")
+            ]
             
-            print(f"Проверка базы данных: {user_count} пользователей, {product_count} товаров")
+            for username, password, role in users:
+                user = User(username=username, role=role)
+                user.set_password(password)
+                db.session.add(user)
             
-            # Если база пуста (нет пользователей), создаем тестовые данные
-            if user_count == 0:
-                print("=" * 60)
-                print("БАЗА ДАННЫХ ПУСТА. СОЗДАЮ ТЕСТОВЫЕ ДАННЫЕ...")
-                print("=" * 60)
+            # Создаем 50 тестовых товаров
+            products = [
+                # Холодильники (5)
+                ("RF-1001", "Холодильник Samsung RB33", 15),
+                ("RF-1002", "Холодильник LG GA-B459", 12),
+                ("RF-1003", "Холодильник Bosch KGN39", 8),
+                ("RF-1004", "Холодильник Haier C2F636", 10),
+                ("RF-1005", "Холодильник Indesit DF 4180", 5),
                 
-                # Создаем тестовых пользователей
-                users = [
-                    ("admin", "storekeeper123", "admin"),
-                    ("ivanov", "password123", "storekeeper"),
-                    ("petrov", "secure456", "storekeeper"),
-                    ("sidorov", "test789", "storekeeper"),
-                    ("manager", "manager123", "storekeeper")
-                ]
+                # Стиральные машины (5)
+                ("WM-2001", "Стиральная машина Bosch WAN28281", 22),
+                ("WM-2002", "Стиральная машина LG F2J3", 18),
+                ("WM-2003", "Стиральная машина Samsung WW90T554", 15),
+                ("WM-2004", "Стиральная машина Electrolux EW6S4R06W", 12),
+                ("WM-2005", "Стиральная машина Beko WUE 6511 XBW", 9),
                 
-                print("\n👥 СОЗДАЮ ПОЛЬЗОВАТЕЛЕЙ:")
-                for username, password, role in users:
-                    user = User(username=username, role=role)
-                    user.set_password(password)
-                    db.session.add(user)
-                    print(f"  ✓ {username} ({role})")
+                # Плиты (5)
+                ("ST-3001", "Электрическая плита Gorenje EC 5121 WG", 11),
+                ("ST-3002", "Электрическая плита Bosch HCE644253", 7),
+                ("ST-3003", "Газовая плита Gefest 1200 С7", 14),
+                ("ST-3004", "Индукционная плита Hansa BHI69307", 6),
+                ("ST-3005", "Плита электрическая Darina 1E EM281 404 W", 8),
                 
-                # Создаем 50 тестовых товаров
-                products = [
-                    # Холодильники (5)
-                    ("RF-1001", "Холодильник Samsung RB33", 15),
-                    ("RF-1002", "Холодильник LG GA-B459", 12),
-                    ("RF-1003", "Холодильник Bosch KGN39", 8),
-                    ("RF-1004", "Холодильник Haier C2F636", 10),
-                    ("RF-1005", "Холодильник Indesit DF 4180", 5),
-                    
-                    # Стиральные машины (5)
-                    ("WM-2001", "Стиральная машина Bosch WAN28281", 22),
-                    ("WM-2002", "Стиральная машина LG F2J3", 18),
-                    ("WM-2003", "Стиральная машина Samsung WW90T554", 15),
-                    ("WM-2004", "Стиральная машина Electrolux EW6S4R06W", 12),
-                    ("WM-2005", "Стиральная машина Beko WUE 6511 XBW", 9),
-                    
-                    # Плиты (5)
-                    ("ST-3001", "Электрическая плита Gorenje EC 5121 WG", 11),
-                    ("ST-3002", "Электрическая плита Bosch HCE644253", 7),
-                    ("ST-3003", "Газовая плита Gefest 1200 С7", 14),
-                    ("ST-3004", "Индукционная плита Hansa BHI69307", 6),
-                    ("ST-3005", "Плита электрическая Darina 1E EM281 404 W", 8),
-                    
-                    # Микроволновые печи (5)
-                    ("MW-4001", "Микроволновая печь Samsung MS23K3515AK", 28),
-                    ("MW-4002", "Микроволновая печь LG MS2042DB", 22),
-                    ("MW-4003", "Микроволновая печь Bosch BFL524MS0", 16),
-                    ("MW-4004", "Микроволновая печь Panasonic NN-ST34", 19),
-                    ("MW-4005", "Микроволновая печь Scarlett SC-1706", 25),
-                    
-                    # Пылесосы (5)
-                    ("VC-5001", "Пылесос Samsung VCC4520S36", 20),
-                    ("VC-5002", "Пылесос Philips FC9353", 17),
-                    ("VC-5003", "Робот-пылесок Xiaomi Mi Robot Vacuum", 9),
-                    ("VC-5004", "Пылесос вертикальный Dyson V11", 4),
-                    ("VC-5005", "Пылесос моющий Karcher SE 4001", 6),
-                    
-                    # Электрочайники (5)
-                    ("KT-6001", "Электрочайник Bosch TWK 3P413", 35),
-                    ("KT-6002", "Электрочайник Philips HD9358", 28),
-                    ("KT-6003", "Электрочайник Tefal KI770D38", 22),
-                    ("KT-6004", "Электрочайник Polaris PWK 1713C", 30),
-                    ("KT-6005", "Электрочайник Scarlett SC-EK27G35", 25),
-                    
-                    # Кофейное оборудование (5)
-                    ("CF-7001", "Кофемашина De'Longhi ECAM 22.110", 5),
-                    ("CF-7002", "Кофемашина Philips EP1220", 7),
-                    ("CF-7003", "Кофеварка Bosch TKA3A031", 9),
-                    ("CF-7004", "Кофемолка Maestro MR-1069", 12),
-                    ("CF-7005", "Френч-пресс Borner Classic", 18),
-                    
-                    # Кухонные комбайны (5)
-                    ("BL-7006", "Блендер погружной Philips HR3655", 14),
-                    ("BL-7007", "Блендер стационарный Bosch MSM66110", 18),
-                    ("KC-7008", "Кухонный комбайн Kenwood FP925", 6),
-                    ("KC-7009", "Кухонный комбайн Moulinex Masterchef", 8),
-                    ("KC-7010", "Мясорубка Zelmer 987.8", 11),
-                    
-                    # Миксеры и тостеры (5)
-                    ("MX-7011", "Миксер ручной Braun MQ 5037", 20),
-                    ("MX-7012", "Миксер стационарный Kitfort КТ-1341", 12),
-                    ("TV-7013", "Тостер Tefal TT450D38", 25),
-                    ("TV-7014", "Тостер-сэндвич Rolsen RSA-259", 17),
-                    ("WA-7015", "Вафельница Marta MT-1943", 13),
-                    
-                    # Климатическая техника (5)
-                    ("AC-8001", "Кондиционер Ballu BSW-07HN1", 6),
-                    ("AC-8002", "Кондиционер Mitsubishi Electric MSZ-HJ25VA", 4),
-                    ("AC-8003", "Кондиционер LG P07EP2", 5),
-                    ("AH-8004", "Увлажнитель воздуха Philips HU4803", 12),
-                    ("AH-8005", "Очиститель воздуха Xiaomi Mi Air Purifier 3H", 10),
-                    
-                    # Техника для ухода за одеждой (5)
-                    ("IR-9001", "Утюг Philips GC4523", 27),
-                    ("IR-9002", "Утюг паровой Tefal FV2838E0", 23),
-                    ("SG-9003", "Отпариватель Philips GC392", 15),
-                    ("SG-9004", "Парогенератор Tefal IS6200", 8),
-                    ("DW-9005", "Посудомоечная машина Bosch SMS 4HVI33E", 9),
-                    
-                    # Техника для личного ухода (5)
-                    ("SH-0010", "Электробритва Braun Series 3", 18),
-                    ("SH-0011", "Триммер Philips BT5500", 22),
-                    ("SH-0012", "Фен Rowenta CV 7120", 25),
-                    ("SH-0013", "Эпилятор Braun Silk-épil 9", 14),
-                    ("SH-0014", "Массажер для лица Foreo Luna 3", 7),
-                    
-                    # Водонагреватели (5)
-                    ("WC-0020", "Водонагреватель Ariston ABS VLS Evo 50", 6),
-                    ("WC-0021", "Очиститель воды Аквафор Осмо 50", 8),
-                    ("WC-0022", "Кулер для воды HotFrost HFC-351A", 4),
-                    ("WC-0023", "Фильтр для воды Барьер Эксперт", 20),
-                    ("WC-0024", "Водонагреватель Thermex Flat Plus 50", 7),
-                    
-                    # Электроника (5)
-                    ("ST-0025", "Стабилизатор напряжения Ресанта АСН-5000", 9),
-                    ("GE-0026", "Генератор Hyundai HY 3000 LE", 3),
-                    ("CA-0027", "Камера видеонаблюдения Reolink RLC-510A", 11),
-                    ("RO-0028", "Розетка умная Xiaomi Smart Socket", 35),
-                    ("RO-0029", "Умная лампочка Philips Hue White", 24),
-                    
-                    # Кухонные приборы (5)
-                    ("GR-0030", "Гриль электрический GFgrill GF-060", 8),
-                    ("MK-0031", "Мультиварка Redmond RMC-M90", 15),
-                    ("YR-0032", "Йогуртница Moulinex YG230", 12),
-                    ("SB-0033", "Соковыжималка Philips HR1832", 9),
-                    ("AF-0034", "Фритюрница Tefal FZ7000", 6),
-                    
-                    # Обогреватели (5)
-                    ("HE-0035", "Обогреватель масляный Electrolux EOH/M", 14),
-                    ("HE-0036", "Тепловентилятор Timberk TFH T20XC", 18),
-                    ("VE-0037", "Вентилятор напольный Scarlett SC-1132", 22),
-                    ("VE-0038", "Вентилятор колонный Dyson AM07", 5),
-                    ("HE-0039", "Обогреватель инфракрасный Ballu BIH-LW", 11),
-                    
-                    # Умный дом (5)
-                    ("SM-0040", "Умная колонка Яндекс Станция", 16),
-                    ("SM-0041", "Робот-мойщик окон Hobot 298", 4),
-                    ("SM-0042", "Умные весы Xiaomi Mi Smart Scale 2", 19),
-                    ("SM-0043", "Метеостанция Ea2 EN209", 13),
-                    ("SM-0044", "Умный дверной звонок Ezviz DB1", 8),
-                    
-                    # Аксессуары (6)
-                    ("AC-0045", "Кабель HDMI 2.0 3м", 45),
-                    ("AC-0046", "Удлинитель электрический IEK", 30),
-                    ("AC-0047", "Сетевой фильтр APC PM5U-RS", 17),
-                    ("AC-0048", "Аккумуляторы AA Duracell", 60),
-                    ("AC-0049", "Зарядное устройство", 21),
-                    ("AC-0050", "Пульт универсальный HUAYU HY-308", 28)
-                ]
+                # Микроволновые печи (5)
+                ("MW-4001", "Микроволновая печь Samsung MS23K3515AK", 28),
+                ("MW-4002", "Микроволновая печь LG MS2042DB", 22),
+                ("MW-4003", "Микроволновая печь Bosch BFL524MS0", 16),
+                ("MW-4004", "Микроволновая печь Panasonic NN-ST34", 19),
+                ("MW-4005", "Микроволновая печь Scarlett SC-1706", 25),
                 
-                print("\n📦 СОЗДАЮ ТОВАРЫ:")
-                created_count = 0
-                for article, name, quantity in products:
-                    # Проверяем, не существует ли уже товар
-                    existing = Product.query.filter_by(article=article).first()
-                    if not existing:
-                        product = Product(article=article, name=name, quantity=quantity)
-                        db.session.add(product)
-                        created_count += 1
-                        if created_count % 10 == 0:
-                            print(f"  ✓ Создано {created_count} товаров...")
+                # Пылесосы (5)
+                ("VC-5001", "Пылесос Samsung VCC4520S36", 20),
+                ("VC-5002", "Пылесос Philips FC9353", 17),
+                ("VC-5003", "Робот-пылесок Xiaomi Mi Robot Vacuum", 9),
+                ("VC-5004", "Пылесос вертикальный Dyson V11", 4),
+                ("VC-5005", "Пылесос моющий Karcher SE 4001", 6),
                 
-                db.session.commit()
+                # Электрочайники (5)
+                ("KT-6001", "Электрочайник Bosch TWK 3P413", 35),
+                ("KT-6002", "Электрочайник Philips HD9358", 28),
+                ("KT-6003", "Электрочайник Tefal KI770D38", 22),
+                ("KT-6004", "Электрочайник Polaris PWK 1713C", 30),
+                ("KT-6005", "Электрочайник Scarlett SC-EK27G35", 25),
                 
-                # Проверяем итоговое количество
-                final_product_count = Product.query.count()
-                final_user_count = User.query.count()
+                # Кофейное оборудование (5)
+                ("CF-7001", "Кофемашина De'Longhi ECAM 22.110", 5),
+                ("CF-7002", "Кофемашина Philips EP1220", 7),
+                ("CF-7003", "Кофеварка Bosch TKA3A031", 9),
+                ("CF-7004", "Кофемолка Maestro MR-1069", 12),
+                ("CF-7005", "Френч-пресс Borner Classic", 18),
                 
-                print("\n" + "=" * 60)
-                print("✅ ТЕСТОВЫЕ ДАННЫЕ СОЗДАНЫ УСПЕШНО!")
-                print("=" * 60)
-                print(f"👥 Пользователей: {final_user_count}")
-                print(f"📦 Товаров: {final_product_count}")
-                print("\n🔐 ДАННЫЕ ДЛЯ ВХОДА:")
-                print("-" * 40)
-                print("Логин: admin | Пароль: storekeeper123")
-                print("Логин: ivanov | Пароль: password123")
-                print("=" * 60)
-            else:
-                print(f"✓ База данных уже содержит {user_count} пользователей и {product_count} товаров")
+                # Кухонные комбайны (5)
+                ("BL-7006", "Блендер погружной Philips HR3655", 14),
+                ("BL-7007", "Блендер стационарный Bosch MSM66110", 18),
+                ("KC-7008", "Кухонный комбайн Kenwood FP925", 6),
+                ("KC-7009", "Кухонный комбайн Moulinex Masterchef", 8),
+                ("KC-7010", "Мясорубка Zelmer 987.8", 11),
                 
-        except Exception as e:
-            print(f"❌ Ошибка при инициализации базы данных: {e}")
-            db.session.rollback()
+                # Миксеры и тостеры (5)
+                ("MX-7011", "Миксер ручной Braun MQ 5037", 20),
+                ("MX-7012", "Миксер стационарный Kitfort КТ-1341", 12),
+                ("TV-7013", "Тостер Tefal TT450D38", 25),
+                ("TV-7014", "Тостер-сэндвич Rolsen RSA-259", 17),
+                ("WA-7015", "Вафельница Marta MT-1943", 13),
+                
+                # Климатическая техника (5)
+                ("AC-8001", "Кондиционер Ballu BSW-07HN1", 6),
+                ("AC-8002", "Кондиционер Mitsubishi Electric MSZ-HJ25VA", 4),
+                ("AC-8003", "Кондиционер LG P07EP2", 5),
+                ("AH-8004", "Увлажнитель воздуха Philips HU4803", 12),
+                ("AH-8005", "Очиститель воздуха Xiaomi Mi Air Purifier 3H", 10),
+                
+                # Техника для ухода за одеждой (5)
+                ("IR-9001", "Утюг Philips GC4523", 27),
+                ("IR-9002", "Утюг паровой Tefal FV2838E0", 23),
+                ("SG-9003", "Отпариватель Philips GC392", 15),
+                ("SG-9004", "Парогенератор Tefal IS6200", 8),
+                ("DW-9005", "Посудомоечная машина Bosch SMS 4HVI33E", 9),
+                
+                # Техника для личного ухода (5)
+                ("SH-0010", "Электробритва Braun Series 3", 18),
+                ("SH-0011", "Триммер Philips BT5500", 22),
+                ("SH-0012", "Фен Rowenta CV 7120", 25),
+                ("SH-0013", "Эпилятор Braun Silk-épil 9", 14),
+                ("SH-0014", "Массажер для лица Foreo Luna 3", 7),
+                
+                # Водонагреватели (5)
+                ("WC-0020", "Водонагреватель Ariston ABS VLS Evo 50", 6),
+                ("WC-0021", "Очиститель воды Аквафор Осмо 50", 8),
+                ("WC-0022", "Кулер для воды HotFrost HFC-351A", 4),
+                ("WC-0023", "Фильтр для воды Барьер Эксперт", 20),
+                ("WC-0024", "Водонагреватель Thermex Flat Plus 50", 7),
+                
+                # Электроника (5)
+                ("ST-0025", "Стабилизатор напряжения Ресанта АСН-5000", 9),
+                ("GE-0026", "Генератор Hyundai HY 3000 LE", 3),
+                ("CA-0027", "Камера видеонаблюдения Reolink RLC-510A", 11),
+                ("RO-0028", "Розетка умная Xiaomi Smart Socket", 35),
+                ("RO-0029", "Умная лампочка Philips Hue White", 24),
+                
+                # Кухонные приборы (5)
+                ("GR-0030", "Гриль электрический GFgrill GF-060", 8),
+                ("MK-0031", "Мультиварка Redmond RMC-M90", 15),
+                ("YR-0032", "Йогуртница Moulinex YG230", 12),
+                ("SB-0033", "Соковыжималка Philips HR1832", 9),
+                ("AF-0034", "Фритюрница Tefal FZ7000", 6),
+                
+                # Обогреватели (5)
+                ("HE-0035", "Обогреватель масляный Electrolux EOH/M", 14),
+                ("HE-0036", "Тепловентилятор Timberk TFH T20XC", 18),
+                ("VE-0037", "Вентилятор напольный Scarlett SC-1132", 22),
+                ("VE-0038", "Вентилятор колонный Dyson AM07", 5),
+                ("HE-0039", "Обогреватель инфракрасный Ballu BIH-LW", 11),
+                
+                # Умный дом (5)
+                ("SM-0040", "Умная колонка Яндекс Станция", 16),
+                ("SM-0041", "Робот-мойщик окон Hobot 298", 4),
+                ("SM-0042", "Умные весы Xiaomi Mi Smart Scale 2", 19),
+                ("SM-0043", "Метеостанция Ea2 EN209", 13),
+                ("SM-0044", "Умный дверной звонок Ezviz DB1", 8),
+                
+                # Аксессуары (6)
+                ("AC-0045", "Кабель HDMI 2.0 3м", 45),
+                ("AC-0046", "Удлинитель электрический IEK", 30),
+                ("AC-0047", "Сетевой фильтр APC PM5U-RS", 17),
+                ("AC-0048", "Аккумуляторы AA Duracell", 60),
+                ("AC-0049", "Зарядное устройство", 21),
+                ("AC-0050", "Пульт универсальный HUAYU HY-308", 28)
+            ]
+            
+            # Одним оператором; уже существующие артикулы не трогаем
+            created_count, _ = importer.upsert_chunk(products, add_quantity=False)
+            
+            db.session.commit()
+            fragment_cache.invalidate()
+            logger.info('Тестовые данные созданы',
+                        extra={'users': len(users), 'products': created_count})
+        else:
+            logger.info('База данных проверена',
+                        extra={'users': user_count, 'products': product_count})
+            
+    except Exception:
+        logger.exception('Ошибка при инициализации базы данных')
+        db.session.rollback()
 
-# Автоматически инициализируем БД при импорте
-# Это сработает и на PythonAnywhere, и при локальном запуске
-init_database()
+# Сколько оплаченных заказов перечислять в сообщении о запрете удаления товара
+PAID_ORDERS_IN_MESSAGE = 10
 
 # Декоратор для проверки авторизации
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            return redirect(url_for('login', next=request.url))
+            return redirect(url_for('main.login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
 
 # Контекстный процессор
-@app.context_processor
+@bp.app_context_processor
 def inject_user_info():
     student_info = {
         'fio': 'Дьячкова Алиса Дмитриевна',
@@ -233,15 +258,19 @@ def inject_user_info():
     }
     
     user_info = {}
+    cart_count = 0
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
+        user = user_cache.current_user_info()
         if user:
             user_info = {
-                'username': user.username,
-                'role': user.role
+                'username': user['username'],
+                'role': user['role']
             }
+            # Количество товаров в корзине (для навигации на всех страницах)
+            cart_count = cart_store.count_items(user['id'])
     
-    return dict(student_info=student_info, user_info=user_info)
+    return dict(student_info=student_info, user_info=user_info, cart_count=cart_count,
+                live_updates=current_app.config.get('SSE_ENABLED', False))
 
 # Валидация
 def validate_credentials(username, password):
@@ -260,65 +289,265 @@ def validate_credentials(username, password):
     
     return True, ''
 
+# Курсоры для keyset-пагинации: непрозрачная строка вместо номера страницы
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Возвращает список значений курсора или None, если курсор пуст или поврежден"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+def fetch_products_after(cursor, limit):
+    """Страница товаров (новые первыми) после курсора: O(limit) при любой глубине.
+
+    Берем limit + 1 строк, чтобы узнать о наличии следующей страницы без COUNT.
+    """
+    query = Product.query.order_by(Product.id.desc())
+    if cursor and isinstance(cursor[0], int):
+        query = query.filter(Product.id < cursor[0])
+    rows = query.limit(limit + 1).all()
+    products = rows[:limit]
+    next_cursor = encode_cursor(products[-1].id) if len(rows) > limit else None
+    return products, next_cursor
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'article': product.article,
+        'name': product.name,
+        'quantity': product.quantity
+    }
+
+# Максимальный размер страницы в JSON API товаров
+API_MAX_LIMIT = 100
+
+def catalog_response(tag, build):
+    """JSON-ответ с ETag/Last-Modified по версии каталога.
+
+    Если копия клиента актуальна, отвечает 304 без чтения товаров; build()
+    вызывается только для полного ответа и может вернуть готовый ответ (404).
+    """
+    version, modified = catalog.get_version()
+    etag = f'{tag}-{version}'
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = (modified is not None and request.if_modified_since is not None
+                 and modified <= request.if_modified_since)
+    
+    if fresh:
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+        if response.status_code != 200:
+            return response
+    
+    response.set_etag(etag)
+    if modified is not None:
+        response.last_modified = modified
+    response.cache_control.private = True
+    max_age = current_app.config.get('API_CACHE_MAX_AGE', 0)
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def product_not_found():
+    response = jsonify({'success': False, 'error': 'Товар не найден'})
+    response.status_code = 404
+    return response
+
+# Живые обновления остатков и статусов заказов (Server-Sent Events)
+def publish_paid_orders(order_ids):
+    """Рассылает новые статусы заказов и остатки их товаров (один запрос остатков)"""
+    if not events.broker.has_subscribers() or not order_ids:
+        return
+    for order_id in order_ids:
+        events.publish_order(order_id, STATUS_PAID)
+    rows = db.session.execute(
+        select(Product.id, Product.quantity)
+        .where(Product.id.in_(select(OrderItem.product_id).where(OrderItem.order_id.in_(order_ids))))
+    )
+    for product_id, quantity in rows:
+        events.publish_product(product_id, quantity)
+
+@bp.route('/events')
+@login_required
+def event_stream():
+    if not current_app.config.get('SSE_ENABLED'):
+        # 204 - браузер прекращает переподключения EventSource
+        return Response(status=204)
+    subscriber = events.broker.subscribe(current_app.config['SSE_MAX_PENDING'],
+                                         current_app.config['SSE_MAX_CLIENTS'])
+    if subscriber is None:
+        return Response('Слишком много подключений', status=503, headers={'Retry-After': '30'})
+    return Response(events.stream(subscriber, current_app.config['SSE_HEARTBEAT'],
+                                  current_app.config.get('SSE_MAX_LIFETIME')),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Главная страница - начальная загрузка
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
-    page = request.args.get('page', 1, type=int)
-    per_page = app.config['ITEMS_PER_PAGE']  # 50 товаров на странице
+    per_page = current_app.config['ITEMS_PER_PAGE']
+    # Старые ссылки вида ?page=N продолжают работать через OFFSET,
+    # основной режим - keyset-пагинация по курсору after_id
+    page = request.args.get('page', 1, type=int) if 'page' in request.args else None
+    after_id = request.args.get('after_id') if page is None else None
     
-    # Пагинация товаров (новые первыми)
-    pagination = Product.query.order_by(Product.id.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    grid, summary = fragment_cache.get_or_render(
+        ('product_grid', per_page, page, after_id),
+        lambda: render_product_grid(per_page, page, after_id)
     )
-    products = pagination.items
-    
-    # Количество товаров в корзине
-    cart_count = sum(session.get('cart', {}).values()) if 'cart' in session else 0
+    return render_template('index.html', grid=grid, summary=summary)
+
+def render_product_grid(per_page, page, after_id):
+    """Сетка товаров с навигацией и сводка страниц: (html, summary или None)"""
+    if page is not None:
+        pagination = Product.query.order_by(Product.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        html = render_template('layout/product_grid.html',
+                               products=pagination.items,
+                               pagination=pagination,
+                               next_cursor=None)
+        summary = {'total': pagination.total, 'page': pagination.page, 'pages': pagination.pages}
+        return Markup(html), summary
     
-    return render_template('index.html', 
-                         products=products,
-                         pagination=pagination,
-                         cart_count=cart_count)
+    products, next_cursor = fetch_products_after(decode_cursor(after_id), per_page)
+    html = render_template('layout/product_grid.html',
+                           products=products,
+                           pagination=None,
+                           next_cursor=next_cursor,
+                           is_first_page=not after_id)
+    return Markup(html), None
 
 # API для загрузки следующих товаров (AJAX)
-@app.route('/load_more_products', methods=['GET'])
+@bp.route('/load_more_products', methods=['GET'])
 @login_required
 def load_more_products():
-    page = request.args.get('page', 1, type=int)
-    items_per_page = app.config['ITEMS_PER_PAGE']
-    
-    # Рассчитываем смещение
-    offset = (page - 1) * items_per_page
-    
-    # Получаем товары для текущей страницы
-    products = Product.query.offset(offset).limit(items_per_page).all()
-    
-    # Преобразуем товары в словари для JSON
-    products_data = []
-    for product in products:
-        products_data.append({
-            'id': product.id,
-            'article': product.article,
-            'name': product.name,
-            'quantity': product.quantity
+    items_per_page = current_app.config['ITEMS_PER_PAGE']
+    
+    # Совместимость со старыми клиентами, которые передают номер страницы
+    if 'page' in request.args and 'after_id' not in request.args:
+        page = request.args.get('page', 1, type=int)
+        
+        def build_page():
+            offset = (max(page, 1) - 1) * items_per_page
+            rows = (Product.query.order_by(Product.id.desc())
+                    .offset(offset).limit(items_per_page + 1).all())
+            products = rows[:items_per_page]
+            has_more = len(rows) > items_per_page
+            next_cursor = encode_cursor(products[-1].id) if has_more else None
+            return jsonify({
+                'success': True,
+                'products': [product_to_dict(p) for p in products],
+                'has_more': has_more,
+                'next_cursor': next_cursor,
+                'current_page': page
+            })
+        return catalog_response('products', build_page)
+    
+    def build():
+        products, next_cursor = fetch_products_after(
+            decode_cursor(request.args.get('after_id')), items_per_page
+        )
+        return jsonify({
+            'success': True,
+            'products': [product_to_dict(p) for p in products],
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
         })
+    return catalog_response('products', build)
+
+# JSON API товаров (v1). Ответы условные: при неизменном каталоге клиент
+# с If-None-Match/If-Modified-Since получает 304 без запроса к товарам.
+@bp.route('/api/v1/products')
+@login_required
+def api_products():
+    limit = min(max(request.args.get('limit', current_app.config['ITEMS_PER_PAGE'], type=int), 1),
+                API_MAX_LIMIT)
     
-    # Проверяем, есть ли еще товары
-    has_more = (offset + len(products)) < Product.query.count()
+    def build():
+        products, next_cursor = fetch_products_after(decode_cursor(request.args.get('after')), limit)
+        return jsonify({
+            'success': True,
+            'products': [product_to_dict(p) for p in products],
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
+        })
+    return catalog_response('products', build)
+
+@bp.route('/api/v1/products/<int:product_id>')
+@login_required
+def api_product(product_id):
+    def build():
+        product = db.session.get(Product, product_id)
+        if product is None:
+            return product_not_found()
+        return jsonify({'success': True, 'product': product_to_dict(product)})
+    return catalog_response('product', build)
+
+@bp.route('/api/v1/products/by-article/<article>')
+@login_required
+def api_product_by_article(article):
+    def build():
+        product = Product.query.filter_by(article=article).first()
+        if product is None:
+            return product_not_found()
+        return jsonify({'success': True, 'product': product_to_dict(product)})
+    return catalog_response('product', build)
+
+def _search_page(args):
+    """Общая часть HTML- и JSON-поиска: (query, rows, next_cursor)"""
+    query = args.get('q', '').strip()
+    cursor = decode_cursor(args.get('after_id'))
+    after = None
+    if cursor and len(cursor) == 2 and all(isinstance(v, (int, float)) for v in cursor):
+        after = tuple(cursor)
     
+    rows, has_more = search.search_products(query, current_app.config['ITEMS_PER_PAGE'], after)
+    next_cursor = encode_cursor(rows[-1].rank, rows[-1].id) if has_more else None
+    return query, rows, next_cursor
+
+# Поиск товаров по названию и артикулу
+@bp.route('/search')
+@login_required
+def search_products():
+    query, products, next_cursor = _search_page(request.args)
+    return render_template('search.html',
+                         query=query,
+                         products=products,
+                         next_cursor=next_cursor)
+
+# API поиска товаров (JSON)
+@bp.route('/api/search')
+@login_required
+def api_search_products():
+    query, products, next_cursor = _search_page(request.args)
     return jsonify({
         'success': True,
-        'products': products_data,
-        'has_more': has_more,
-        'current_page': page
+        'query': query,
+        'products': [product_to_dict(p) for p in products],
+        'has_more': next_cursor is not None,
+        'next_cursor': next_cursor
     })
 
 # Страница регистрации
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if 'user_id' in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if request.method == 'POST':
         username = request.form['username'].strip()
@@ -346,7 +575,7 @@ def register():
             db.session.commit()
             
             flash('Регистрация успешна! Теперь вы можете войти в систему.')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при регистрации: {str(e)}')
@@ -355,10 +584,10 @@ def register():
     return render_template('register.html')
 
 # Страница входа
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if 'user_id' in session:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if request.method == 'POST':
         username = request.form['username'].strip()
@@ -378,19 +607,20 @@ def login():
             next_page = request.args.get('next')
             if next_page:
                 return redirect(next_page)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Неверный логин или пароль')
     
     return render_template('login.html')
 
 # Выход
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(session['user_id'])
     session.clear()
     flash('Вы вышли из системы')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
     if request.method == 'GET':
         # Просто показываем форму
         return render_template('delete_account.html')
@@ -402,7 +632,7 @@ def logout():
             
             if not user:
                 flash('Пользователь не найден')
-                return redirect(url_for('index'))
+                return redirect(url_for('main.index'))
             
             # Проверяем подтверждение логина
             confirm_username = request.form.get('confirm_username', '').strip()
@@ -416,7 +646,7 @@ def logout():
             
             if total_users <= 1:
                 flash('Нельзя удалить последнего пользователя в системе')
-                return redirect(url_for('profile'))
+                return redirect(url_for('main.profile'))
             
             # Если пользователь admin, проверяем есть ли другие админы
             if user.username == 'admin':
@@ -426,7 +656,7 @@ def logout():
                 ).count()
                 if other_admins == 0:
                     flash('Нельзя удалить последнего администратора')
-                    return redirect(url_for('profile'))
+                    return redirect(url_for('main.profile'))
             
             # Удаляем пользователя
             username = user.username
@@ -435,18 +665,16 @@ def logout():
             db.session.commit()
             
             flash(f'Аккаунт {username} успешно удален')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при удалении аккаунта: {str(e)}')
-            print(f"Ошибка удаления аккаунта: {e}")
-            import traceback
-            traceback.print_exc()
-            return redirect(url_for('profile'))
+            logger.exception('Ошибка удаления аккаунта')
+            return redirect(url_for('main.profile'))
 
 # Добавление товара
-@app.route('/add_product', methods=['GET', 'POST'])
+@bp.route('/add_product', methods=['GET', 'POST'])
 @login_required
 def add_product():
     if request.method == 'POST':
@@ -467,144 +695,182 @@ def add_product():
             flash('Введите корректное количество')
             return render_template('add_product.html')
         
-        existing_product = Product.query.filter_by(article=article).first()
+        # Один оператор INSERT ... ON CONFLICT: количество увеличивается в базе
+        # (quantity = quantity + N), поэтому параллельные списания и поступления
+        # из других процессов не перезаписываются
+        inserted, _ = importer.upsert_chunk([(article, name, quantity)])
+        db.session.commit()
+        fragment_cache.invalidate()
         
-        if existing_product:
-            existing_product.quantity += quantity
-            db.session.commit()
-            flash(f'Количество товара "{existing_product.name}" увеличено на {quantity}')
-        else:
-            new_product = Product(article=article, name=name, quantity=quantity)
-            db.session.add(new_product)
-            db.session.commit()
+        product = Product.query.filter_by(article=article).first()
+        if product is not None:
+            events.publish_product(product.id, product.quantity, product.article, product.name)
+        if inserted:
             flash(f'Товар "{name}" добавлен в базу')
+        else:
+            flash(f'Количество товара "{product.name if product else name}" увеличено на {quantity}')
         
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     return render_template('add_product.html')
 
+# Пакетный импорт товаров из файла (CSV или NDJSON)
+@bp.route('/import_products', methods=['GET', 'POST'])
+@login_required
+def import_products():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        
+        if not upload or not upload.filename:
+            flash('Выберите файл для импорта')
+            return render_template('import_products.html')
+        
+        fmt = request.form.get('format') or importer.detect_format(upload.filename)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        
+        try:
+            result = importer.import_products(stream, fmt)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при импорте: {str(e)}', 'error')
+            return render_template('import_products.html')
+        finally:
+            # Импорт фиксирует пачки по мере записи, часть могла попасть в базу
+            fragment_cache.invalidate()
+        
+        flash(f'Импорт завершен: добавлено {result.inserted}, обновлено {result.updated}, '
+              f'отклонено {result.rejected}', 'success' if not result.rejected else 'warning')
+        return render_template('import_products.html', result=result)
+    
+    return render_template('import_products.html')
+
 # Удаление товара (улучшенная версия с информативными сообщениями)
-@app.route('/delete_product/<int:product_id>', methods=['POST'])
+@bp.route('/delete_product/<int:product_id>', methods=['POST'])
 @login_required
 def delete_product(product_id):
     try:
-        print(f"=== DEBUG: Удаление товара ID: {product_id} ===")
+        # 0. Первой идет запись - удаление товара из корзин всех пользователей:
+        # она берет блокировку записи SQLite, и до commit/rollback никто не
+        # оплатит заказ с этим товаром между проверкой и удалением
+        cart_store.purge_product(product_id)
         
         product = Product.query.get(product_id)
         
         if not product:
+            db.session.rollback()
             flash('❌ Товар не найден')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         
-        # 1. Проверяем, есть ли товар в заказах
-        order_items = OrderItem.query.filter_by(product_id=product_id).all()
-        print(f"Найдено записей в order_item: {len(order_items)}")
+        product_name = product.name
         
-        if order_items:
-            # Собираем информацию о заказах для пользователя
-            orders_info = []
-            paid_orders_count = 0
-            unpaid_orders_count = 0
-            
-            for item in order_items:
-                print(f"  OrderItem ID: {item.id}, Order ID: {item.order_id}")
-                if item.order:
-                    print(f"    Статус заказа: {item.order.status}")
-                    orders_info.append({
-                        'order_id': item.order.id,
-                        'status': item.order.status,
-                        'date': item.order.created_at.strftime('%d.%m.%Y %H:%M'),
-                        'quantity': item.quantity
-                    })
-                    
-                    if item.order.status == 'оплачен':
-                        paid_orders_count += 1
-                    else:
-                        unpaid_orders_count += 1
-            
-            # Проверяем, есть ли оплаченные заказы
-            if paid_orders_count > 0:
-                # Формируем детальное сообщение
-                order_details = ""
-                for info in orders_info:
-                    if info['status'] == 'оплачен':
-                        order_details += f"№{info['order_id']} ({info['date']}, {info['quantity']} шт.), "
-                
-                if order_details:
-                    order_details = order_details[:-2]  # Убираем последнюю запятую
-                
-                flash(f'❌ Нельзя удалить товар "{product.name}"!<br>'
-                      f'Товар находится в <strong>оплаченных заказах</strong>: {order_details}.<br>'
-                      f'Всего найдено в {len(order_items)} заказах: {paid_orders_count} оплаченных, {unpaid_orders_count} неоплаченных.')
-                return redirect(url_for('index'))
+        # 1. Сводка по заказам с этим товаром одним агрегирующим запросом
+        lines_count, orders_count, paid_orders_count = (
+            db.session.query(
+                func.count(OrderItem.id),
+                func.count(distinct(OrderItem.order_id)),
+                func.count(distinct(case((Order.status == STATUS_PAID, Order.id))))
+            )
+            .join(Order, Order.id == OrderItem.order_id)
+            .filter(OrderItem.product_id == product_id)
+            .one()
+        )
+        unpaid_orders_count = orders_count - paid_orders_count
+        
+        # Проверяем, есть ли оплаченные заказы
+        if paid_orders_count > 0:
+            paid_orders = (
+                db.session.query(Order.id, Order.created_at, func.sum(OrderItem.quantity))
+                .join(OrderItem, OrderItem.order_id == Order.id)
+                .filter(OrderItem.product_id == product_id, Order.status == STATUS_PAID)
+                .group_by(Order.id)
+                .order_by(Order.id)
+                .limit(PAID_ORDERS_IN_MESSAGE)
+                .all()
+            )
+            order_details = ', '.join(
+                f"№{order_id} ({created_at.strftime('%d.%m.%Y %H:%M')}, {quantity} шт.)"
+                for order_id, created_at, quantity in paid_orders
+            )
+            if paid_orders_count > len(paid_orders):
+                order_details += f' и еще {paid_orders_count - len(paid_orders)}'
             
+            db.session.rollback()
+            flash(f'❌ Нельзя удалить товар "{product_name}"!<br>'
+                  f'Товар находится в <strong>оплаченных заказах</strong>: {order_details}.<br>'
+                  f'Всего найдено в {orders_count} заказах: {paid_orders_count} оплаченных, {unpaid_orders_count} неоплаченных.')
+            return redirect(url_for('main.index'))
+        
+        deleted_orders_count = 0
+        if lines_count:
             # Если есть только неоплаченные заказы - можно удалить, но с предупреждением
-            flash(f'⚠️ Внимание! Товар "{product.name}" находится в {len(order_items)} неоплаченных заказах.<br>'
+            flash(f'⚠️ Внимание! Товар "{product_name}" находится в {orders_count} неоплаченных заказах.<br>'
                   f'Все связанные заказы будут автоматически удалены.', 'warning')
             
-            # 2. Удаляем ВСЕ связанные OrderItem записи
-            print("Удаляем связанные OrderItem записи...")
-            deleted_orders = set()  # Для отслеживания удаленных заказов
+            # 2. Удаляем неоплаченные заказы, в которых кроме этого товара ничего нет.
+            # Удаления ограничены неоплаченными заказами: история оплаченных
+            # продаж не удаляется ни при каких условиях
+            orders_with_product = select(OrderItem.order_id).where(OrderItem.product_id == product_id)
+            other_items = (
+                select(OrderItem.id)
+                .where(OrderItem.order_id == Order.id, OrderItem.product_id != product_id)
+                .exists()
+            )
+            deleted_orders_count = db.session.execute(
+                delete(Order).where(Order.id.in_(orders_with_product), Order.status == STATUS_UNPAID,
+                                    ~other_items),
+                execution_options={'synchronize_session': False}
+            ).rowcount
             
-            for item in order_items:
-                # Удаляем OrderItem
-                db.session.delete(item)
-                print(f"  Удален OrderItem ID: {item.id}")
-                deleted_orders.add(item.order_id)
+            # 3. Удаляем позиции с этим товаром, кроме позиций оплаченных заказов
+            # (в том числе позиции удаленных заказов)
+            paid_orders_ids = select(Order.id).where(Order.status == STATUS_PAID)
+            db.session.execute(
+                delete(OrderItem).where(OrderItem.product_id == product_id,
+                                        OrderItem.order_id.not_in(paid_orders_ids)),
+                execution_options={'synchronize_session': False}
+            )
             
-            # 3. Проверяем, остались ли пустые заказы
-            for order_id in deleted_orders:
-                # Проверяем, есть ли другие товары в этом заказе
-                other_items = OrderItem.query.filter_by(order_id=order_id).all()
-                
-                # Если заказ пустой - удаляем и сам заказ
-                if not other_items:
-                    order = Order.query.get(order_id)
-                    if order:
-                        db.session.delete(order)
-                        print(f"  Удален пустой Order ID: {order.id}")
-                        flash(f'🗑️ Удален пустой заказ №{order.id}', 'info')
-        
-        # 4. Удаляем товар из корзины всех пользователей
-        if 'cart' in session and str(product_id) in session['cart']:
-            session['cart'].pop(str(product_id))
-            session.modified = True
-            print(f"Удален из корзины")
-        
-        # 5. Удаляем сам товар
-        print(f"Удаляем товар: {product.name}")
-        db.session.delete(product)
+            # Если позиции остались, товар в оплаченном заказе - ничего не удаляем
+            if db.session.query(OrderItem.id).filter(OrderItem.product_id == product_id).first():
+                db.session.rollback()
+                flash(f'❌ Нельзя удалить товар "{product_name}": он находится в оплаченных заказах')
+                return redirect(url_for('main.index'))
         
-        # 6. Фиксируем изменения
+        # 4. Удаляем сам товар и фиксируем изменения
+        db.session.delete(product)
         db.session.commit()
+        fragment_cache.invalidate()
+        events.publish_product_deleted(product_id)
         
-        if order_items:
-            flash(f'✅ Товар "{product.name}" удален вместе с {len(order_items)} связанными заказами')
-        else:
-            flash(f'✅ Товар "{product.name}" успешно удален')
+        if deleted_orders_count:
+            flash(f'🗑️ Удалено пустых заказов: {deleted_orders_count}', 'info')
         
-        print("Удаление завершено успешно!")
+        if lines_count:
+            flash(f'✅ Товар "{product_name}" удален из {orders_count} связанных заказов')
+        else:
+            flash(f'✅ Товар "{product_name}" успешно удален')
         
     except Exception as e:
         db.session.rollback()
         flash(f'❌ Ошибка при удалении товара: {str(e)}')
-        print(f"Ошибка удаления товара: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Ошибка удаления товара', extra={'product_id': product_id})
     
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 # Корзина
-@app.route('/cart')
+@bp.route('/cart')
 @login_required
 def view_cart():
-    cart = session.get('cart', {})
+    cart = cart_store.get_items(session['user_id'])
     
     cart_items = []
     total_items = 0
     
-    for product_id_str, quantity in cart.items():
-        product = Product.query.get(int(product_id_str))
+    # Все товары корзины одним запросом
+    products = load_products(cart.keys())
+    
+    for product_id, quantity in cart.items():
+        product = products.get(product_id)
         if product:
             cart_items.append({
                 'product': product,
@@ -615,7 +881,7 @@ def view_cart():
     return render_template('cart.html', cart_items=cart_items, total_items=total_items)
 
 # Добавление товара в корзину
-@app.route('/add_to_cart', methods=['POST'])
+@bp.route('/add_to_cart', methods=['POST'])
 @login_required
 def add_to_cart():
     product_id = request.form.get('product_id')
@@ -626,167 +892,476 @@ def add_to_cart():
         quantity = int(quantity)
     except (ValueError, TypeError):
         flash('Неверные данные')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     product = Product.query.get(product_id)
     if not product:
         flash('Товар не найден')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if quantity <= 0:
         flash('Количество должно быть положительным')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if quantity > product.quantity:
         flash(f'Недостаточно товара на складе. Доступно: {product.quantity}')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    cart = session['cart']
-    current_quantity = cart.get(str(product_id), 0)
+    current_quantity = cart_store.get_quantity(session['user_id'], product_id)
     
     if current_quantity + quantity > product.quantity:
         flash(f'Нельзя добавить больше, чем есть на складе. Уже в корзине: {current_quantity}')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    cart[str(product_id)] = current_quantity + quantity
-    session['cart'] = cart
-    session.modified = True
+    cart_store.add_item(session['user_id'], product_id, quantity)
+    db.session.commit()
     
     flash(f'Товар "{product.name}" добавлен в корзину!')
-    return redirect(url_for('index'))  # Перезагрузка страницы
+    return redirect(url_for('main.index'))  # Перезагрузка страницы
 
 # Удаление товара из корзины
-@app.route('/remove_from_cart/<product_id>', methods=['POST'])
+@bp.route('/remove_from_cart/<product_id>', methods=['POST'])
 @login_required
 def remove_from_cart(product_id):
-    cart = session.get('cart', {})
+    try:
+        product_id = int(product_id)
+    except ValueError:
+        return redirect(url_for('main.view_cart'))
     
-    if str(product_id) in cart:
-        cart.pop(str(product_id))
-        session['cart'] = cart
-        session.modified = True
+    if cart_store.remove_item(session['user_id'], product_id):
+        db.session.commit()
         flash('Товар удален из корзины')
     
-    return redirect(url_for('view_cart'))
+    return redirect(url_for('main.view_cart'))
 
 # Очистка корзины
-@app.route('/clear_cart', methods=['POST'])
+@bp.route('/clear_cart', methods=['POST'])
 @login_required
 def clear_cart():
-    if 'cart' in session:
-        session.pop('cart')
+    if cart_store.clear(session['user_id']):
+        db.session.commit()
         flash('Корзина очищена')
     
-    return redirect(url_for('view_cart'))
+    return redirect(url_for('main.view_cart'))
 
 # Создание заказа
-@app.route('/create_order', methods=['POST'])
+@bp.route('/create_order', methods=['POST'])
 @login_required
 def create_order():
-    if 'cart' not in session or not session['cart']:
-        flash('Корзина пуста')
-        return redirect(url_for('view_cart'))
+    cart = cart_store.get_items(session['user_id'])
     
-    cart = session['cart']
+    if not cart:
+        flash('Корзина пуста')
+        return redirect(url_for('main.view_cart'))
     
     try:
-        order = Order(status='неоплачен')
-        db.session.add(order)
+        products = load_products(cart.keys())
+        lines = []
         
-        for product_id_str, quantity in cart.items():
-            product = Product.query.get(int(product_id_str))
+        for product_id, quantity in cart.items():
+            product = products.get(product_id)
             
             if not product:
-                flash(f'Товар с ID {product_id_str} не найден')
+                flash(f'Товар с ID {product_id} не найден')
                 continue
             
             if product.quantity < quantity:
                 flash(f'Недостаточно товара "{product.name}" на складе. Доступно: {product.quantity}')
-                db.session.rollback()
-                return redirect(url_for('view_cart'))
+                return redirect(url_for('main.view_cart'))
             
-            order_item = OrderItem(order=order, product=product, quantity=quantity)
-            db.session.add(order_item)
+            lines.append((product.id, quantity))
         
-        db.session.commit()
+        if not lines:
+            flash('В корзине нет доступных товаров')
+            return redirect(url_for('main.view_cart'))
+        
+        order = Order(status=STATUS_UNPAID)
+        db.session.add(order)
+        db.session.flush()
         
-        session.pop('cart', None)
-        session.modified = True
+        # Все позиции заказа одной пакетной вставкой, корзина очищается в той же транзакции
+        add_order_lines(order.id, lines)
+        cart_store.clear(session['user_id'])
+        db.session.commit()
+        events.publish_order(order.id, order.status)
         
         flash(f'Заказ №{order.id} успешно создан! Статус: {order.status}')
-        return redirect(url_for('view_orders'))
+        return redirect(url_for('main.view_orders'))
     
     except Exception as e:
         db.session.rollback()
         flash(f'Ошибка при создании заказа: {str(e)}')
-        return redirect(url_for('view_cart'))
+        logger.exception('Ошибка при создании заказа')
+        return redirect(url_for('main.view_cart'))
+
+# Максимум позиций в заказе, создаваемом через API
+API_MAX_ORDER_LINES = 500
+
+def parse_order_lines(lines):
+    """(article -> quantity, ошибка) из JSON-списка позиций; повторы артикулов складываются"""
+    if not isinstance(lines, list) or not lines:
+        return None, 'lines - непустой список позиций {"article", "quantity"}'
+    if len(lines) > API_MAX_ORDER_LINES:
+        return None, f'В заказе может быть не более {API_MAX_ORDER_LINES} позиций'
+    
+    quantities = {}
+    for number, line in enumerate(lines, 1):
+        article = line.get('article') if isinstance(line, dict) else None
+        quantity = line.get('quantity') if isinstance(line, dict) else None
+        if not isinstance(article, str) or not article.strip():
+            return None, f'Позиция {number}: не указан артикул'
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            return None, f'Позиция {number}: количество должно быть целым числом больше 0'
+        article = article.strip()
+        quantities[article] = quantities.get(article, 0) + quantity
+    return quantities, None
+
+def order_payload(order_id):
+    """Заказ с позициями для ответа API или None, если заказа нет"""
+    order = db.session.get(Order, order_id)
+    if order is None:
+        return None
+    lines = db.session.execute(
+        select(Product.article, OrderItem.product_id, OrderItem.quantity)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+    ).all()
+    return {
+        'id': order.id,
+        'status': order.status,
+        'created_at': order.created_at.isoformat(sep=' ', timespec='seconds') if order.created_at else None,
+        'lines': [{'article': article, 'product_id': product_id, 'quantity': quantity}
+                  for article, product_id, quantity in lines]
+    }
+
+# Создание заказа целиком одним JSON-запросом (терминалы сбора). Заголовок
+# Idempotency-Key обязателен: повтор запроса не создает второй заказ.
+@bp.route('/api/v1/orders', methods=['POST'])
+@login_required
+def api_create_order():
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+        return jsonify({'success': False,
+                        'error': f'Нужен заголовок Idempotency-Key (до {idempotency.MAX_KEY_LENGTH} символов)'}), 400
+    
+    data = request.get_json(silent=True)
+    quantities, error = parse_order_lines(data.get('lines') if isinstance(data, dict) else None)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    user_id = session['user_id']
+    request_fingerprint = idempotency.fingerprint(quantities)
+    
+    existing = idempotency.lookup(user_id, key)
+    if existing is None:
+        try:
+            order = create_order_by_articles(quantities)
+        except UnknownArticles as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Артикулы не найдены',
+                            'unknown_articles': e.articles}), 422
+        except StockShortage as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Недостаточно товара на складе',
+                            'shortages': [s._asdict() for s in e.shortages]}), 409
+        
+        if idempotency.remember(user_id, key, request_fingerprint, order.id):
+            events.publish_order(order.id, STATUS_UNPAID)
+            return jsonify({'success': True, 'order': order_payload(order.id)}), 201
+        
+        # Параллельный запрос с тем же ключом успел раньше - отвечаем как на повтор
+        existing = idempotency.lookup(user_id, key)
+        if existing is None:
+            return jsonify({'success': False, 'error': 'Повторите запрос'}), 409
+    
+    if existing.fingerprint != request_fingerprint:
+        return jsonify({'success': False,
+                        'error': 'Idempotency-Key уже использован для другого заказа'}), 422
+    
+    payload = order_payload(existing.order_id)
+    if payload is None:
+        return jsonify({'success': False, 'error': 'Заказ, созданный по этому ключу, удален'}), 410
+    return jsonify({'success': True, 'order': payload}), 201, {'Idempotent-Replayed': 'true'}
 
 # Просмотр заказов
-@app.route('/orders')
+@bp.route('/orders')
 @login_required
 def view_orders():
     page = request.args.get('page', 1, type=int)
-    pagination = Order.query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=app.config['ITEMS_PER_PAGE'], error_out=False
-    )
+    # Позиции и товары подгружаются пакетно (SELECT ... IN) для всей страницы:
+    # фиксированное число запросов вместо 1 + N + N*M
+    pagination = (Order.query
+                  .options(selectinload(Order.items).selectinload(OrderItem.product),
+                           undefer(Order.items_count))
+                  .order_by(Order.created_at.desc())
+                  .paginate(page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False))
     orders = pagination.items
     
     return render_template('orders.html', orders=orders, pagination=pagination)
 
 # Отметка заказа как оплаченного
-@app.route('/mark_paid/<int:order_id>', methods=['POST'])
+@bp.route('/mark_paid/<int:order_id>', methods=['POST'])
 @login_required
 def mark_paid(order_id):
     order = Order.query.get(order_id)
     
     if not order:
         flash('Заказ не найден')
-        return redirect(url_for('view_orders'))
+        return redirect(url_for('main.view_orders'))
+    
+    if order.status == STATUS_PAID:
+        flash('Заказ уже оплачен')
+        return redirect(url_for('main.view_orders'))
+    
+    try:
+        paid = pay_order(order.id)
+    except StockShortage as e:
+        details = ', '.join(f'"{s.name}" (арт. {s.article}): нужно {s.needed}, доступно {s.available}'
+                            for s in e.shortages)
+        flash(f'Заказ №{order_id} не оплачен: недостаточно товара на складе. {details}', 'error')
+        return redirect(url_for('main.view_orders'))
     
-    if order.status == 'оплачен':
+    if not paid:
         flash('Заказ уже оплачен')
-        return redirect(url_for('view_orders'))
+        return redirect(url_for('main.view_orders'))
+    
+    fragment_cache.invalidate()
+    publish_paid_orders([order_id])
+    flash(f'Заказ №{order_id} отмечен как оплаченный. Количество товаров на складе обновлено.')
+    return redirect(url_for('main.view_orders'))
+
+# Сколько заказов можно оплатить одним запросом
+BULK_PAY_LIMIT = 200
+
+def describe_shortages(shortages):
+    return ', '.join(f'"{s.name}" (арт. {s.article}): нужно {s.needed}, доступно {s.available}'
+                     for s in shortages)
+
+# Пакетная оплата выбранных заказов (одна транзакция)
+@bp.route('/mark_paid_bulk', methods=['POST'])
+@login_required
+def mark_paid_bulk():
+    order_ids = request.form.getlist('order_ids', type=int)
     
-    order.status = 'оплачен'
+    if not order_ids:
+        flash('Выберите заказы для оплаты')
+        return redirect(url_for('main.view_orders'))
     
-    for item in order.items:
-        product = item.product
-        product.quantity -= item.quantity
-        
-        if product.quantity < 0:
-            product.quantity = 0
+    if len(order_ids) > BULK_PAY_LIMIT:
+        flash(f'За один раз можно оплатить не более {BULK_PAY_LIMIT} заказов', 'error')
+        return redirect(url_for('main.view_orders'))
     
-    db.session.commit()
+    try:
+        results = pay_orders(order_ids)
+    except StockShortage as e:
+        flash(f'Заказы не оплачены: остатки изменились во время оплаты. {describe_shortages(e.shortages)}', 'error')
+        return redirect(url_for('main.view_orders'))
+    
+    paid = [r.order_id for r in results if r.status == PAYMENT_PAID]
+    if paid:
+        fragment_cache.invalidate()
+        publish_paid_orders(paid)
+        flash(f'Оплачено заказов: {len(paid)}. Количество товаров на складе обновлено.')
     
-    flash(f'Заказ №{order.id} отмечен как оплаченный. Количество товаров на складе обновлено.')
-    return redirect(url_for('view_orders'))
+    for result in results:
+        if result.status == PAYMENT_SHORTAGE:
+            flash(f'Заказ №{result.order_id} не оплачен: недостаточно товара на складе. '
+                  f'{describe_shortages(result.shortages)}', 'error')
+    
+    already_paid = sum(1 for r in results if r.status == PAYMENT_ALREADY_PAID)
+    if already_paid:
+        flash(f'Уже были оплачены: {already_paid}')
+    not_found = sum(1 for r in results if r.status == PAYMENT_NOT_FOUND)
+    if not_found:
+        flash(f'Не найдено заказов: {not_found}')
+    
+    return redirect(url_for('main.view_orders'))
+
+@bp.route('/api/v1/orders/pay', methods=['POST'])
+@login_required
+def api_pay_orders():
+    data = request.get_json(silent=True)
+    order_ids = data.get('order_ids') if isinstance(data, dict) else None
+    
+    if (not isinstance(order_ids, list) or not order_ids
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in order_ids)):
+        return jsonify({'success': False, 'error': 'order_ids - непустой список номеров заказов'}), 400
+    
+    if len(order_ids) > BULK_PAY_LIMIT:
+        return jsonify({'success': False,
+                        'error': f'За один раз можно оплатить не более {BULK_PAY_LIMIT} заказов'}), 400
+    
+    try:
+        results = pay_orders(order_ids)
+    except StockShortage as e:
+        return jsonify({'success': False, 'error': 'Остатки изменились во время оплаты',
+                        'shortages': [s._asdict() for s in e.shortages]}), 409
+    
+    paid = [r.order_id for r in results if r.status == PAYMENT_PAID]
+    if paid:
+        fragment_cache.invalidate()
+        publish_paid_orders(paid)
+    
+    return jsonify({
+        'success': True,
+        'paid': len(paid),
+        'results': [{'order_id': r.order_id,
+                     'status': r.status,
+                     'shortages': [s._asdict() for s in r.shortages]}
+                    for r in results]
+    })
+
+# Отчеты по журналу движения товара (см. ledger.py). Время - ISO 8601;
+# без часового пояса считается UTC, как и время в базе.
+def parse_moment(value, default=None):
+    if not value:
+        return default
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_product_ids(value):
+    """Список id из "1,2,3"; None - все товары"""
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(',')]
+    except ValueError:
+        return None
+
+def stock_rows(values):
+    """Строки отчета по товарам с артикулом и названием (для существующих товаров)"""
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(list(values))).all()} if values else {}
+    rows = []
+    for product_id in sorted(values):
+        product = products.get(product_id)
+        row = {'product_id': product_id,
+               'article': product.article if product else None,
+               'name': product.name if product else None}
+        value = values[product_id]
+        row.update(value if isinstance(value, dict) else {'quantity': value})
+        rows.append(row)
+    return rows
+
+def bad_report_request():
+    return jsonify({'success': False,
+                    'error': 'Неверные параметры: время в ISO 8601, product_id - числа через запятую'}), 400
+
+@bp.route('/api/v1/stock')
+@login_required
+def api_stock_at():
+    at = parse_moment(request.args.get('at'), datetime.now(timezone.utc).replace(tzinfo=None))
+    product_ids = parse_product_ids(request.args.get('product_id'))
+    if at is None or (request.args.get('product_id') and product_ids is None):
+        return bad_report_request()
+    
+    snapshot, balances = ledger.stock_at(at, product_ids)
+    return jsonify({
+        'success': True,
+        'at': at.isoformat(sep=' ', timespec='seconds'),
+        'snapshot': {'id': snapshot.id,
+                     'taken_at': snapshot.taken_at.isoformat(sep=' ', timespec='seconds')} if snapshot else None,
+        'products': stock_rows(balances)
+    })
+
+@bp.route('/api/v1/stock/movements')
+@login_required
+def api_stock_movements():
+    end = parse_moment(request.args.get('to'), datetime.now(timezone.utc).replace(tzinfo=None))
+    start = parse_moment(request.args.get('from'))
+    product_ids = parse_product_ids(request.args.get('product_id'))
+    if (start is None or end is None or start > end
+            or (request.args.get('product_id') and product_ids is None)):
+        return bad_report_request()
+    
+    return jsonify({
+        'success': True,
+        'from': start.isoformat(sep=' ', timespec='seconds'),
+        'to': end.isoformat(sep=' ', timespec='seconds'),
+        'products': stock_rows(ledger.movement_summary(start, end, product_ids))
+    })
+
+@bp.route('/api/v1/stock/<int:product_id>/movements')
+@login_required
+def api_product_movements(product_id):
+    start = parse_moment(request.args.get('from'))
+    end = parse_moment(request.args.get('to'))
+    if (request.args.get('from') and start is None) or (request.args.get('to') and end is None):
+        return bad_report_request()
+    limit = min(max(request.args.get('limit', API_MAX_LIMIT, type=int), 1), API_MAX_LIMIT)
+    
+    return jsonify({
+        'success': True,
+        'product_id': product_id,
+        'movements': [{'id': m.id,
+                       'delta': m.delta,
+                       'balance': m.balance,
+                       'kind': m.kind,
+                       'created_at': m.created_at.isoformat(sep=' ', timespec='seconds')}
+                      for m in ledger.product_movements(product_id, start, end, limit)]
+    })
+
+# Аналитика продаж по сводкам (см. analytics.py): объем заказов по дням или
+# неделям с разбивкой оплачен/не оплачен и самые заказываемые товары.
+# Даты - YYYY-MM-DD включительно, по умолчанию последние 30 дней.
+ANALYTICS_DEFAULT_DAYS = 30
+
+def parse_day(value, default):
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+@bp.route('/api/v1/analytics')
+@login_required
+def api_analytics():
+    end = parse_day(request.args.get('to'), datetime.now(timezone.utc).date())
+    start = parse_day(request.args.get('from'),
+                      end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1) if end else None)
+    period = request.args.get('period', 'day')
+    top = min(max(request.args.get('top', 10, type=int), 1), API_MAX_LIMIT)
+    if start is None or end is None or start > end or period not in ('day', 'week'):
+        return jsonify({'success': False,
+                        'error': 'Неверные параметры: from/to - YYYY-MM-DD, period - day или week'}), 400
+    
+    return jsonify({
+        'success': True,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'period': period,
+        'volume': analytics.order_volume(start, end, period),
+        'top_products': analytics.top_products(start, end, top)
+    })
 
 # Профиль пользователя
-@app.route('/profile')
+@bp.route('/profile')
 @login_required
 def profile():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='неоплачен').count()
-    completed_orders = Order.query.filter_by(status='оплачен').count()
+    counts = stats.summary()
     
     return render_template('profile.html', 
                           user=user,
-                          total_orders=total_orders,
-                          pending_orders=pending_orders,
-                          completed_orders=completed_orders)
+                          total_orders=counts['orders'],
+                          pending_orders=counts['orders_unpaid'],
+                          completed_orders=counts['orders_paid'])
 
 # Маршрут для проверки состояния базы данных
-@app.route('/check-db')
+@bp.route('/check-db')
 def check_db():
     """Проверка состояния базы данных"""
-    user_count = User.query.count()
-    product_count = Product.query.count()
-    order_count = Order.query.count()
+    counts = stats.summary()
+    user_count = counts['users']
+    product_count = counts['products']
+    order_count = counts['orders']
     
     return f"""
     <!DOCTYPE html>
@@ -840,15 +1415,15 @@ def check_db():
     </html>
     """
 # Редактирование аккаунта
-@app.route('/edit_account', methods=['POST'])
+@bp.route('/edit_account', methods=['POST'])
 @login_required
 def edit_account():
     try:
-        user = User.query.get(session['user_id'])
+        user = current_user()
         
         if not user:
             flash('Пользователь не найден', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         new_username = request.form.get('username', '').strip()
         current_password = request.form.get('current_password', '').strip()
@@ -857,12 +1432,12 @@ def edit_account():
         # Проверяем текущий пароль
         if not user.check_password(current_password):
             flash('Неверный текущий пароль', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         # Проверяем логин
         if not new_username:
             flash('Логин не может быть пустым', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         # Проверяем, не занят ли логин другим пользователем
         existing_user = User.query.filter(
@@ -872,7 +1447,7 @@ def edit_account():
         
         if existing_user:
             flash('Этот логин уже занят другим пользователем', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         # Обновляем логин
         user.username = new_username
@@ -882,11 +1457,12 @@ def edit_account():
             # Проверяем длину пароля
             if len(new_password) < 6:
                 flash('Пароль должен быть не менее 6 символов', 'error')
-                return redirect(url_for('profile'))
+                return redirect(url_for('main.profile'))
             
             user.set_password(new_password)
         
         db.session.commit()
+        user_cache.invalidate(session['user_id'])
         
         # Обновляем данные в сессии
         session['username'] = user.username
@@ -897,31 +1473,31 @@ def edit_account():
         db.session.rollback()
         flash(f'Ошибка при обновлении данных: {str(e)}', 'error')
     
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
 
 # Удаление аккаунта
-@app.route('/delete_account', methods=['POST'])
+@bp.route('/delete_account', methods=['POST'])
 @login_required
 def delete_account():
     try:
-        user = User.query.get(session['user_id'])
+        user = current_user()
         
         if not user:
             flash('Пользователь не найден', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         
         confirm_username = request.form.get('confirm_username', '').strip()
         
         if confirm_username != user.username:
             flash('Введенный логин не совпадает с вашим', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         # Проверяем, не последний ли это пользователь
         total_users = User.query.count()
         
         if total_users <= 1:
             flash('Нельзя удалить последнего пользователя в системе', 'error')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         
         # Если пользователь admin, проверяем есть ли другие админы
         if user.username == 'admin':
@@ -931,25 +1507,30 @@ def delete_account():
             ).count()
             if other_admins == 0:
                 flash('Нельзя удалить последнего администратора', 'error')
-                return redirect(url_for('profile'))
+                return redirect(url_for('main.profile'))
         
         username = user.username
+        user_id = user.id
         
-        # Удаляем пользователя
+        # Удаляем пользователя вместе с его корзиной и ключами идемпотентности
         session.clear()
+        cart_store.clear(user_id)
+        idempotency.forget_user(user_id)
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         
         flash(f'Аккаунт "{username}" успешно удален', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     except Exception as e:
         db.session.rollback()
         flash(f'Ошибка при удалении аккаунта: {str(e)}', 'error')
-        return redirect(url_for('profile'))
+        logger.exception('Ошибка удаления аккаунта')
+        return redirect(url_for('main.profile'))
     
 # Маршрут для принудительной инициализации БД
-@app.route('/init-db')
+@bp.route('/init-db')
 def init_db_route():
     """Принудительная инициализация базы данных"""
     try:
@@ -971,4 +1552,7 @@ if __name__ == '__main__':
     print("Для проверки базы данных: http://127.0.0.1:5000/check-db")
     print("Для входа используйте: admin / storekeeper123")
     print("=" * 60)
+    app = create_app()
+    with app.app_context():
+        init_database()
     app.run(debug=True)
\ No newline at end of file
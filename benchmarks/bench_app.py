@@ -0,0 +1,260 @@
+"""Нагрузочный прогон маршрутов приложения через Flask test client.
+
+Запуск из корня проекта:
+    python benchmarks/bench_app.py --products 20000 --orders 5000 --requests 200
+    python benchmarks/bench_app.py --workers 4 --mode process --output bench.json
+
+Скрипт создает временную базу заданного размера (товары, пользователи,
+заказы с несколькими позициями), затем вызывает реальные маршруты
+(index, load_more_products, view_orders, view_cart, add_to_cart,
+create_order, mark_paid, profile, login) в одном или нескольких потоках
+или процессах. Для каждого маршрута в JSON выводятся p50/p95/p99,
+средняя задержка, пропускная способность и число SQL-запросов на запрос.
+Сеть не нужна, результаты воспроизводимы при одинаковом --seed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_PASSWORD = 'benchpass1'
+ROUTES = ['index', 'load_more_products', 'view_orders', 'view_cart', 'add_to_cart',
+          'create_order', 'mark_paid', 'profile', 'login']
+
+_app = None
+_db = None
+_local = threading.local()
+
+def load_app(database_path):
+    """Создает приложение поверх временной базы и считает SQL-запросы"""
+    global _app, _db
+    from sqlalchemy import event
+    from app import create_app
+    from config import Config
+    from models.models import db
+    import migrations
+    
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+        TESTING = True
+    
+    app = create_app(BenchConfig)
+    with app.app_context():
+        migrations.upgrade()
+        
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args):
+            _local.queries = getattr(_local, 'queries', 0) + 1
+    
+    _app, _db = app, db
+    return app
+
+def seed(args):
+    """Заполняет базу генератором datagen; возвращает параметры для сценариев"""
+    from sqlalchemy import select
+    import datagen
+    from models.models import User, Product, Order
+    from inventory import STATUS_UNPAID
+    
+    with _app.app_context():
+        # Остаток с запасом, чтобы оплата заказов не упиралась в нехватку товара
+        datagen.generate(products=args.products, orders=args.orders, users=args.users,
+                         max_lines=args.max_lines, seed=args.seed,
+                         password=BENCH_PASSWORD, stock=1_000_000)
+        session = _db.session
+        usernames = session.scalars(
+            select(User.username).where(User.username.like('gen%')).order_by(User.id)
+        ).all()
+        product_ids = session.scalars(select(Product.id)).all()
+        unpaid = session.scalars(select(Order.id).where(Order.status == STATUS_UNPAID)).all()
+    
+    return {'product_ids': product_ids, 'unpaid_order_ids': unpaid, 'usernames': usernames}
+
+def login(client, username, password=BENCH_PASSWORD):
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'Не удалось войти как {username}')
+
+class Scenario:
+    """Запросы одного рабочего потока; неизмеряемая подготовка делается здесь же"""
+    
+    def __init__(self, worker, ctx, seed_value):
+        self.rnd = random.Random(seed_value)
+        self.ctx = ctx
+        self.username = ctx['usernames'][worker % len(ctx['usernames'])]
+        self.client = _app.test_client()
+        login(self.client, self.username)
+        self.cursor = None
+    
+    def prepare(self, route):
+        if route == 'load_more_products' and not self.cursor:
+            page = self.client.get('/').get_data(as_text=True)
+            match = re.search(r'data-next-cursor="([^"]+)"', page)
+            self.cursor = match.group(1) if match else ''
+        elif route in ('view_cart', 'create_order'):
+            self.client.post('/add_to_cart', data={'product_id': self.product(), 'quantity': 1})
+    
+    def product(self):
+        return self.rnd.choice(self.ctx['product_ids'])
+    
+    def request(self, route):
+        client = self.client
+        if route == 'index':
+            return client.get('/')
+        if route == 'load_more_products':
+            response = client.get(f'/load_more_products?after_id={self.cursor}')
+            self.cursor = (response.get_json() or {}).get('next_cursor')
+            return response
+        if route == 'view_orders':
+            return client.get(f'/orders?page={self.rnd.randint(1, 20)}')
+        if route == 'view_cart':
+            return client.get('/cart')
+        if route == 'add_to_cart':
+            return client.post('/add_to_cart', data={'product_id': self.product(), 'quantity': 1})
+        if route == 'create_order':
+            return client.post('/create_order')
+        if route == 'mark_paid':
+            orders = self.ctx['unpaid_order_ids']
+            order_id = orders.pop() if orders else 0
+            return client.post(f'/mark_paid/{order_id}')
+        if route == 'profile':
+            return client.get('/profile')
+        if route == 'login':
+            fresh = _app.test_client()
+            return fresh.post('/login', data={'username': self.username, 'password': BENCH_PASSWORD})
+        raise ValueError(route)
+
+def run_worker(worker, ctx, routes, requests, seed_value):
+    """Выполняет requests запросов к каждому маршруту; возвращает замеры"""
+    scenario = Scenario(worker, ctx, seed_value)
+    samples = {route: [] for route in routes}
+    for route in routes:
+        for _ in range(requests):
+            scenario.prepare(route)
+            _local.queries = 0
+            started = time.perf_counter()
+            response = scenario.request(route)
+            elapsed = time.perf_counter() - started
+            ok = response.status_code < 400
+            samples[route].append((elapsed, _local.queries, ok))
+    return samples
+
+def _process_worker(args):
+    # После fork у процесса должны быть свои соединения с базой
+    with _app.app_context():
+        _db.engine.dispose(close=False)
+    return run_worker(*args)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(all_samples, busy_times):
+    """busy_times - время, которое самый загруженный рабочий провел в измеряемых
+    запросах маршрута (без подготовки), по нему считается пропускная способность"""
+    report = {}
+    for route, samples in all_samples.items():
+        latencies = sorted(s[0] for s in samples)
+        queries = [s[1] for s in samples]
+        errors = sum(1 for s in samples if not s[2])
+        wall = busy_times.get(route)
+        report[route] = {
+            'requests': len(samples),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+            'sql_queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        }
+    return report
+
+def run(args, ctx):
+    routes = args.routes
+    all_samples = {route: [] for route in routes}
+    busy_times = {}
+    
+    # Маршруты прогоняются по очереди, внутри маршрута - все рабочие параллельно
+    for route in routes:
+        # Каждому рабочему - своя часть неоплаченных заказов для mark_paid
+        jobs = [(worker,
+                 dict(ctx, unpaid_order_ids=ctx['unpaid_order_ids'][worker::args.workers]),
+                 [route], args.requests, args.seed + worker)
+                for worker in range(args.workers)]
+        if args.mode == 'process' and args.workers > 1:
+            with multiprocessing.get_context('fork').Pool(args.workers) as pool:
+                results = pool.map(_process_worker, jobs)
+        elif args.workers > 1:
+            results = [None] * args.workers
+            
+            def target(index, job):
+                results[index] = run_worker(*job)
+            threads = [threading.Thread(target=target, args=(i, job)) for i, job in enumerate(jobs)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            results = [run_worker(*jobs[0])]
+        busy_times[route] = max(sum(s[0] for s in result[route]) for result in results)
+        for result in results:
+            all_samples[route].extend(result[route])
+    
+    return summarize(all_samples, busy_times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон маршрутов приложения')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--max-lines', type=int, default=5, help='максимум позиций в заказе')
+    parser.add_argument('--requests', type=int, default=100, help='запросов на маршрут и рабочего')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=ROUTES)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл для JSON-отчета (по умолчанию stdout)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        load_app(os.path.join(directory, 'bench.db'))
+        started = time.perf_counter()
+        ctx = seed(args)
+        seed_seconds = time.perf_counter() - started
+        
+        report = {
+            'meta': {
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'seed_seconds': round(seed_seconds, 2),
+                'params': vars(args),
+            },
+            'routes': run(args, ctx),
+        }
+    
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
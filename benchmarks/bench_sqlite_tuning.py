@@ -0,0 +1,125 @@
+"""Пропускная способность чтения при параллельной записи: SQLite по умолчанию
+против настроек из Config (WAL, busy_timeout, cache_size и т.д.).
+
+Запуск из корня проекта:
+    python benchmarks/bench_sqlite_tuning.py --products 20000 --duration 5
+
+Для каждого режима создается отдельная временная база, затем N потоков
+читают страницы каталога, а M потоков в это же время списывают остатки
+короткими транзакциями. Результат печатается в JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from db_tuning import sqlite_pragmas, apply_pragmas
+
+def seed(path, products):
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE product (
+        id INTEGER PRIMARY KEY, article VARCHAR(50) UNIQUE NOT NULL,
+        name VARCHAR(200) NOT NULL, quantity INTEGER NOT NULL DEFAULT 0)""")
+    conn.executemany(
+        "INSERT INTO product(article, name, quantity) VALUES (?, ?, ?)",
+        ((f'BN-{i:07d}', f'Товар {i}', 1_000_000) for i in range(products))
+    )
+    conn.commit()
+    conn.close()
+
+def connect(path, pragmas):
+    # timeout=0: ожидание блокировки определяется только PRAGMA busy_timeout
+    conn = sqlite3.connect(path, timeout=0, check_same_thread=False)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+def run(path, pragmas, products, readers, writers, duration, page_size):
+    stop = threading.Event()
+    lock = threading.Lock()
+    totals = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    
+    def add(key, value=1):
+        with lock:
+            totals[key] += value
+    
+    def reader(seed_value):
+        rnd = random.Random(seed_value)
+        conn = connect(path, pragmas)
+        while not stop.is_set():
+            after = rnd.randint(page_size, products)
+            try:
+                conn.execute("SELECT id, article, name, quantity FROM product "
+                             "WHERE id < ? ORDER BY id DESC LIMIT ?", (after, page_size)).fetchall()
+                add('reads')
+            except sqlite3.OperationalError:
+                add('read_errors')
+        conn.close()
+    
+    def writer(seed_value):
+        rnd = random.Random(seed_value)
+        conn = connect(path, pragmas)
+        while not stop.is_set():
+            ids = [rnd.randint(1, products) for _ in range(5)]
+            try:
+                with conn:
+                    conn.executemany("UPDATE product SET quantity = quantity - 1 "
+                                     "WHERE id = ? AND quantity >= 1", ((i,) for i in ids))
+                add('writes')
+            except sqlite3.OperationalError:
+                add('write_errors')
+        conn.close()
+    
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    
+    return {
+        'reads_per_sec': round(totals['reads'] / duration, 1),
+        'writes_per_sec': round(totals['writes'] / duration, 1),
+        'read_errors': totals['read_errors'],
+        'write_errors': totals['write_errors'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--page-size', type=int, default=Config.ITEMS_PER_PAGE)
+    args = parser.parse_args()
+    
+    config = {k: getattr(Config, k) for k in dir(Config) if k.startswith('SQLITE_')}
+    modes = {
+        # Поведение до настройки: журнал DELETE и ожидание блокировки драйвером
+        'default': [('busy_timeout', 5000), ('journal_mode', 'DELETE')],
+        'tuned': sqlite_pragmas(config),
+    }
+    
+    report = {'params': vars(args), 'results': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, pragmas in modes.items():
+            path = os.path.join(directory, f'{mode}.db')
+            seed(path, args.products)
+            result = run(path, pragmas, args.products, args.readers, args.writers,
+                         args.duration, args.page_size)
+            result['pragmas'] = dict(pragmas)
+            report['results'][mode] = result
+    
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
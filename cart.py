@@ -0,0 +1,40 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from models.models import db, CartItem
+
+# Корзина на стороне сервера: позиции хранятся в таблице cart_item по пользователю,
+# а не в подписанной cookie сессии. Все чтения идут по индексу (user_id, product_id).
+
+def get_items(user_id):
+    """Содержимое корзины: словарь product_id -> quantity"""
+    rows = db.session.query(CartItem.product_id, CartItem.quantity).filter_by(user_id=user_id)
+    return {product_id: quantity for product_id, quantity in rows}
+
+def count_items(user_id):
+    """Общее количество единиц товара в корзине"""
+    return db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)) \
+        .filter_by(user_id=user_id).scalar()
+
+def get_quantity(user_id, product_id):
+    quantity = db.session.query(CartItem.quantity) \
+        .filter_by(user_id=user_id, product_id=product_id).scalar()
+    return quantity or 0
+
+def add_item(user_id, product_id, quantity):
+    """Добавляет товар в корзину или увеличивает количество уже добавленного"""
+    stmt = insert(CartItem).values(user_id=user_id, product_id=product_id, quantity=quantity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'product_id'],
+        set_={'quantity': CartItem.quantity + stmt.excluded.quantity}
+    )
+    db.session.execute(stmt)
+
+def remove_item(user_id, product_id):
+    return CartItem.query.filter_by(user_id=user_id, product_id=product_id).delete()
+
+def clear(user_id):
+    return CartItem.query.filter_by(user_id=user_id).delete()
+
+def purge_product(product_id):
+    """Убирает товар из корзин всех пользователей"""
+    return CartItem.query.filter_by(product_id=product_id).delete()
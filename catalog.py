@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+from models.models import db, StatCounter
+
+# Версия каталога товаров для условных HTTP-ответов (ETag/Last-Modified).
+# Любое добавление, изменение или удаление товара увеличивает счетчик
+# catalog_version и записывает время изменения в catalog_modified (секунды
+# Unix) - триггерами в той же транзакции. Проверка "изменился ли каталог" -
+# один запрос по первичному ключу stat_counter без чтения товаров.
+
+VERSION = 'catalog_version'
+MODIFIED = 'catalog_modified'
+
+_BUMP_STATEMENTS = [
+    f"""INSERT INTO stat_counter(name, value) VALUES ('{VERSION}', 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1""",
+    f"""INSERT INTO stat_counter(name, value) VALUES ('{MODIFIED}', CAST(strftime('%s', 'now') AS INTEGER))
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value""",
+]
+_BUMP = ''.join(f'{statement}; ' for statement in _BUMP_STATEMENTS)
+
+CATALOG_SCHEMA = [
+    f"CREATE TRIGGER IF NOT EXISTS catalog_product_insert AFTER INSERT ON product BEGIN {_BUMP} END",
+    f"""CREATE TRIGGER IF NOT EXISTS catalog_product_update AFTER UPDATE ON product
+    WHEN OLD.article IS NOT NEW.article OR OLD.name IS NOT NEW.name OR OLD.quantity IS NOT NEW.quantity
+    BEGIN {_BUMP} END""",
+    f"CREATE TRIGGER IF NOT EXISTS catalog_product_delete AFTER DELETE ON product BEGIN {_BUMP} END",
+]
+
+def install():
+    """Создает триггеры и начальные значения версии (без commit)"""
+    for statement in CATALOG_SCHEMA:
+        db.session.execute(text(statement))
+    if db.session.get(StatCounter, VERSION) is None:
+        rebuild()
+
+def rebuild():
+    """Новая версия каталога (после изменений в обход триггеров)"""
+    for statement in _BUMP_STATEMENTS:
+        db.session.execute(text(statement))
+
+def get_version():
+    """(версия, время последнего изменения в UTC или None)"""
+    rows = dict(db.session.query(StatCounter.name, StatCounter.value)
+                .filter(StatCounter.name.in_((VERSION, MODIFIED))))
+    modified = rows.get(MODIFIED)
+    if modified is not None:
+        modified = datetime.fromtimestamp(modified, timezone.utc)
+    return rows.get(VERSION, 0), modified
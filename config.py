@@ -2,6 +2,59 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///database.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    ITEMS_PER_PAGE = 10  # Уменьшим для тестирования
\ No newline at end of file
+    ITEMS_PER_PAGE = 10  # Уменьшим для тестирования
+    # Сколько секунд клиент может не перепроверять ответы API товаров (0 - всегда с ETag)
+    API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 0))
+    # Кэш отрендеренной сетки товаров главной страницы, записей (0 - выключен)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+    # Сколько секунд хранится ключ идемпотентности API заказов (0 - бессрочно)
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # секунд, 0 - без кэша
+    
+    # Пул соединений SQLAlchemy. Размеры пула добавляются к
+    # SQLALCHEMY_ENGINE_OPTIONS только для QueuePool (см. db_tuning.engine_options):
+    # база в памяти (sqlite://) работает через StaticPool, который их не принимает
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '0') == '1',
+    }
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    
+    # PRAGMA для каждого нового соединения SQLite (см. db_tuning.py).
+    # WAL позволяет читать во время записи, busy_timeout - ждать блокировку
+    # вместо мгновенной ошибки "database is locked".
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # мс
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -20000))  # < 0 - в КиБ
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # байт
+    SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+    
+    # Метрики запросов на /metrics (см. metrics.py); Server-Timing - замеры
+    # в заголовке ответа для инструментов разработчика браузера
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+    
+    # Логирование (см. logs.py): уровень задается отдельно для каждого
+    # окружения, в продакшене обычно WARNING, при разработке - DEBUG
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json или text
+    LOG_FILE = os.environ.get('LOG_FILE')  # по умолчанию - stderr
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    
+    # Живые обновления /events (Server-Sent Events, см. events.py). Открытый
+    # поток занимает поток обработчика сервера, пока открыта вкладка, поэтому
+    # обновления включаются явно и только с сервером, у которого на процесс
+    # потоков заметно больше SSE_MAX_CLIENTS: gunicorn --worker-class gthread
+    # --threads N (или gevent). С синхронными рабочими (sync) каждая вкладка
+    # занимала бы целый процесс, и обычные запросы перестали бы обслуживаться.
+    SSE_ENABLED = os.environ.get('SSE_ENABLED', '0') == '1'
+    SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 4))  # на процесс
+    # Через столько секунд поток закрывается, и браузер переподключается:
+    # соединения не держат обработчик бесконечно
+    SSE_MAX_LIFETIME = int(os.environ.get('SSE_MAX_LIFETIME', 300))
+    SSE_MAX_PENDING = int(os.environ.get('SSE_MAX_PENDING', 1000))  # событий на клиента
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))  # секунд
@@ -1,20 +1,44 @@
-from app import app, db
-from models.models import User, Product, Order, OrderItem
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from sqlalchemy import select
+from app import create_app, init_database
+from models.models import db, User, Product, Order, OrderItem, CartItem, IdempotencyKey
+import importer
+import datagen
+import stats
+import migrations
+import ledger
+import analytics
+import idempotency
+
+app = create_app()
 
 def check_database():
     """Проверка текущего состояния базы данных"""
     with app.app_context():
         try:
-            users_count = User.query.count()
-            products_count = Product.query.count()
-            orders_count = Order.query.count()
+            repaired = migrations.repair_triggers()
+            db.session.commit()
+            counts = stats.summary()
+            users_count = counts['users']
+            products_count = counts['products']
+            orders_count = counts['orders']
             
             print("=" * 60)
             print("ПРОВЕРКА СОСТОЯНИЯ БАЗЫ ДАННЫХ")
             print("=" * 60)
             print(f"👥 Пользователей: {users_count}")
             print(f"📦 Товаров: {products_count}")
-            print(f"📋 Заказов: {orders_count}")
+            print(f"📋 Заказов: {orders_count} "
+                  f"(неоплаченных: {counts['orders_unpaid']}, оплаченных: {counts['orders_paid']})")
+            print(f"🔧 Версия схемы: {migrations.current_version()} из {migrations.latest_version()}")
+            if repaired:
+                print(f"⚠️  Восстановлены триггеры (данные пересчитаны): {', '.join(repaired)}")
             
             # Выводим первых 5 пользователей
             if users_count > 0:
@@ -45,16 +69,16 @@ def check_database():
             # Даем рекомендации
             if users_count == 0:
                 print("⚠️  РЕКОМЕНДАЦИЯ: В базе нет пользователей!")
-                print("   Запустите приложение Flask - оно автоматически создаст тестовых пользователей")
+                print("   Выполните: python database.py init - будут созданы тестовые пользователи")
             
             if products_count == 0:
                 print("⚠️  РЕКОМЕНДАЦИЯ: В базе нет товаров!")
-                print("   Запустите приложение Flask - оно автоматически создаст 50 тестовых товаров")
+                print("   Выполните: python database.py init - будут созданы тестовые товары")
                 
         except Exception as e:
             print(f"❌ Ошибка при проверке базы данных: {e}")
             print("   Возможно, таблицы еще не созданы.")
-            print("   Запустите приложение Flask для создания таблиц.")
+            print("   Выполните: python database.py init для создания таблиц.")
 
 def reset_database():
     """Очистка всей базы данных (осторожно!)"""
@@ -79,7 +103,12 @@ def reset_database():
             if confirmation == 'ДА':
                 print("\n🧹 Удаляю данные...")
                 
-                # Удаляем в правильном порядке из-за внешних ключей
+                # Удаляем в правильном порядке из-за внешних ключей.
+                # Корзины и ключи идемпотентности - тоже: SQLite снова выдает id
+                # очищенной таблицы, и новый пользователь получил бы корзину
+                # старого, а повтор ключа - ссылку на удаленный заказ
+                CartItem.query.delete()
+                IdempotencyKey.query.delete()
                 OrderItem.query.delete()
                 Order.query.delete()
                 Product.query.delete()
@@ -87,7 +116,7 @@ def reset_database():
                 
                 db.session.commit()
                 print("✅ База данных очищена!")
-                print("\nℹ️  Теперь запустите приложение Flask для создания новых данных.")
+                print("\nℹ️  Для создания новых данных выполните: python database.py init")
             else:
                 print("❌ Операция отменена")
                 
@@ -95,64 +124,149 @@ def reset_database():
             db.session.rollback()
             print(f"❌ Ошибка при очистке базы: {e}")
 
-def backup_database():
-    """Создание резервной копии данных в текстовом формате"""
-    import os
-    from datetime import datetime
+# Таблицы для выгрузки; хэши паролей наружу не выгружаются
+EXPORT_MODELS = [User, Product, Order, OrderItem]
+EXPORT_EXCLUDED_COLUMNS = {'password_hash'}
+EXPORT_CHUNK_SIZE = 1000
+
+def _export_value(value):
+    return value.isoformat(sep=' ') if isinstance(value, datetime) else value
+
+def export_table(model, path, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Потоково выгружает таблицу в CSV или NDJSON, читая строки пачками"""
+    table = model.__table__
+    columns = [c for c in table.columns if c.name not in EXPORT_EXCLUDED_COLUMNS]
+    names = [c.name for c in columns]
     
+    result = db.session.execute(
+        select(*columns).order_by(table.c.id),
+        execution_options={'yield_per': chunk_size}
+    )
+    
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(names)
+        for rows in result.partitions():
+            for row in rows:
+                values = [_export_value(v) for v in row]
+                if fmt == 'csv':
+                    writer.writerow(values)
+                else:
+                    f.write(json.dumps(dict(zip(names, values)), ensure_ascii=False) + '\n')
+            count += len(rows)
+    return count
+
+def export_database(directory=None, fmt='csv'):
+    """Выгрузка всех таблиц в отдельные файлы CSV/NDJSON"""
     with app.app_context():
         try:
-            # Создаем имя файла с датой
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"backup_{timestamp}.txt"
+            directory = directory or f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.makedirs(directory, exist_ok=True)
+            extension = 'csv' if fmt == 'csv' else 'ndjson'
+            
+            print(f"📤 Выгружаю данные в каталог: {directory}")
+            for model in EXPORT_MODELS:
+                path = os.path.join(directory, f"{model.__tablename__}.{extension}")
+                count = export_table(model, path, fmt)
+                print(f"  ✓ {model.__tablename__}: {count} строк")
+            
+            print("✅ Выгрузка завершена")
+            return directory
+            
+        except Exception as e:
+            print(f"❌ Ошибка при выгрузке данных: {e}")
+
+def _database_path():
+    return db.engine.url.database
+
+def backup_database(filename=None, step_pages=-1):
+    """Горячая резервная копия через online backup API SQLite.
+
+    Копия согласована на момент снятия, приложение при этом продолжает
+    работать. step_pages > 0 копирует базу порциями страниц и отпускает
+    блокировку между шагами; -1 копирует за один шаг.
+    """
+    with app.app_context():
+        try:
+            filename = filename or f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
             
             print(f"📋 Создаю резервную копию в файл: {filename}")
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write("=" * 60 + "\n")
-                f.write("РЕЗЕРВНАЯ КОПИЯ БАЗЫ ДАННЫХ СКЛАДА\n")
-                f.write(f"Дата создания: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-                f.write("=" * 60 + "\n\n")
-                
-                # Пользователи
-                users = User.query.all()
-                f.write("👥 ПОЛЬЗОВАТЕЛИ:\n")
-                f.write("-" * 40 + "\n")
-                for user in users:
-                    f.write(f"  {user.id}. {user.username} ({user.role})\n")
-                f.write(f"Всего: {len(users)} пользователей\n\n")
-                
-                # Товары
-                products = Product.query.all()
-                f.write("📦 ТОВАРЫ:\n")
-                f.write("-" * 40 + "\n")
-                for product in products:
-                    f.write(f"  {product.id}. {product.article} - {product.name} ({product.quantity} шт.)\n")
-                f.write(f"Всего: {len(products)} товаров\n\n")
-                
-                # Заказы
-                orders = Order.query.all()
-                f.write("📋 ЗАКАЗЫ:\n")
-                f.write("-" * 40 + "\n")
-                for order in orders:
-                    f.write(f"  Заказ #{order.id} - {order.status} ({order.created_at})\n")
-                f.write(f"Всего: {len(orders)} заказов\n")
-                
+            source = sqlite3.connect(_database_path())
+            target = sqlite3.connect(filename)
+            try:
+                with target:
+                    source.backup(target, pages=step_pages)
+            finally:
+                target.close()
+                source.close()
+            
             print(f"✅ Резервная копия создана успешно!")
             print(f"   Файл: {filename}")
             print(f"   Размер: {os.path.getsize(filename)} байт")
+            return filename
             
         except Exception as e:
             print(f"❌ Ошибка при создании резервной копии: {e}")
 
+def restore_database(filename, confirm=True):
+    """Восстановление базы из резервной копии, созданной backup_database()"""
+    with app.app_context():
+        try:
+            source = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+            try:
+                status = source.execute("PRAGMA integrity_check").fetchone()[0]
+                if status != 'ok':
+                    print(f"❌ Резервная копия повреждена: {status}")
+                    return False
+                
+                if confirm:
+                    answer = input(f"\nБаза будет заменена содержимым {filename}. Введите 'ДА': ")
+                    if answer != 'ДА':
+                        print("❌ Операция отменена")
+                        return False
+                
+                # Закрываем соединения пула, чтобы после восстановления не было старых данных
+                db.session.remove()
+                db.engine.dispose()
+                
+                target = sqlite3.connect(_database_path())
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+            
+            print(f"✅ База данных восстановлена из {filename}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Ошибка при восстановлении из резервной копии: {e}")
+            return False
+
+def initialize_database():
+    """Создание схемы и тестовых данных (однократно, до запуска рабочих процессов)"""
+    with app.app_context():
+        print("🔧 Применяю миграции и создаю тестовые данные в пустой базе...")
+        init_database()
+        counts = stats.summary()
+        print(f"✅ Версия схемы: {migrations.current_version()}")
+        print(f"👥 Пользователей: {counts['users']}")
+        print(f"📦 Товаров: {counts['products']}")
+        return counts
+
 def repair_database():
     """Попытка восстановления базы данных"""
     with app.app_context():
         try:
             print("🔧 Проверяю и восстанавливаю базу данных...")
             
-            # Создаем таблицы, если их нет
+            # Создаем таблицы, если их нет, и применяем недостающие миграции
             db.create_all()
+            migrations.upgrade()
             print("✅ Таблицы проверены/созданы")
             
             # Проверяем подключение
@@ -164,6 +278,126 @@ def repair_database():
         except Exception as e:
             print(f"❌ Ошибка при восстановлении базы: {e}")
 
+def migrate_database(target=None):
+    """Применение миграций схемы до последней (или указанной) версии"""
+    with app.app_context():
+        try:
+            print(f"🔧 Текущая версия схемы: {migrations.current_version()}")
+            applied = migrations.upgrade(target)
+            for number, description in applied:
+                print(f"  ✓ {number}: {description}")
+            if not applied:
+                print("✅ Схема уже актуальна")
+            else:
+                print(f"✅ Схема обновлена до версии {migrations.current_version()}")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при применении миграций: {e}")
+            return False
+
+def rebuild_analytics():
+    """Пересчет сводок продаж по текущим заказам"""
+    with app.app_context():
+        try:
+            analytics.rebuild()
+            db.session.commit()
+            print("✅ Сводки продаж пересчитаны")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при пересчете сводок продаж: {e}")
+            return False
+
+def purge_idempotency_keys(hours=None):
+    """Удаление устаревших ключей идемпотентности API заказов"""
+    with app.app_context():
+        try:
+            ttl = hours * 3600 if hours is not None else app.config['IDEMPOTENCY_KEY_TTL']
+            deleted = idempotency.purge(idempotency.expiry_cutoff(ttl))
+            db.session.commit()
+            print(f"✅ Удалено ключей идемпотентности: {deleted}")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при удалении ключей идемпотентности: {e}")
+            return False
+
+def take_stock_snapshot(reconcile=False):
+    """Снимок остатков для журнала движения товара (запускать периодически)"""
+    with app.app_context():
+        try:
+            if reconcile:
+                adjusted = ledger.reconcile()
+                print(f"✅ Корректирующих движений записано: {adjusted}")
+            snapshot = ledger.take_snapshot()
+            db.session.commit()
+            print(f"✅ Снимок остатков #{snapshot.id} от {snapshot.taken_at} "
+                  f"(включая движение #{snapshot.last_movement_id})")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при создании снимка остатков: {e}")
+            return False
+
+def rebuild_stats():
+    """Пересчет счетчиков статистики по текущим данным"""
+    with app.app_context():
+        try:
+            stats.rebuild()
+            db.session.commit()
+            print("✅ Счетчики статистики пересчитаны")
+            for name, value in sorted(stats.get_counts().items()):
+                print(f"  {name}: {value}")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при пересчете статистики: {e}")
+            return False
+
+def import_products_file(path, fmt=None, chunk_size=importer.CHUNK_SIZE):
+    """Пакетный импорт товаров из CSV или NDJSON файла"""
+    with app.app_context():
+        try:
+            print(f"📥 Импортирую товары из файла: {path}")
+            result = importer.import_file(path, fmt, chunk_size)
+            
+            print(f"✅ Добавлено: {result.inserted}")
+            print(f"🔄 Обновлено: {result.updated}")
+            print(f"⚠️  Отклонено: {result.rejected}")
+            for error in result.errors:
+                print(f"   {error}")
+            return result
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при импорте: {e}")
+
+def generate_data(products=10000, orders=10000, users=10, max_lines=5,
+                  paid_ratio=0.5, seed=1, until=datagen.DEFAULT_UNTIL):
+    """Наполнение базы синтетическими данными для нагрузочных тестов"""
+    with app.app_context():
+        try:
+            print(f"🧪 Генерирую данные: товаров {products}, заказов {orders}, пользователей {users}")
+            started = datetime.now()
+            result = datagen.generate(products=products, orders=orders, users=users,
+                                      max_lines=max_lines, paid_ratio=paid_ratio, seed=seed,
+                                      until=until)
+            elapsed = (datetime.now() - started).total_seconds()
+            
+            print(f"✅ Пользователей: {result.users}")
+            print(f"✅ Товаров: {result.products}")
+            print(f"✅ Заказов: {result.orders}")
+            print(f"✅ Позиций заказов: {result.lines}")
+            print(f"⏱️  Время: {elapsed:.1f} с")
+            if result.users:
+                print(f"🔑 Пароль пользователей gen*: {datagen.DEFAULT_PASSWORD}")
+            return result
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Ошибка при генерации данных: {e}")
+
 def show_menu():
     """Отображение меню утилиты"""
     print("=" * 60)
@@ -174,9 +408,13 @@ def show_menu():
     print("2. Создать резервную копию")
     print("3. Восстановить/проверить базу данных")
     print("4. Очистить всю базу данных (опасно!)")
-    print("5. Выйти")
+    print("5. Импортировать товары из файла (CSV/NDJSON)")
+    print("6. Выгрузить данные в CSV")
+    print("7. Восстановить из резервной копии")
+    print("8. Инициализировать базу (схема и тестовые данные)")
+    print("9. Выйти")
     
-    choice = input("\nВаш выбор (1-5): ").strip()
+    choice = input("\nВаш выбор (1-9): ").strip()
     
     if choice == '1':
         check_database()
@@ -187,6 +425,18 @@ def show_menu():
     elif choice == '4':
         reset_database()
     elif choice == '5':
+        path = input("Путь к файлу: ").strip()
+        if path:
+            import_products_file(path)
+    elif choice == '6':
+        export_database()
+    elif choice == '7':
+        filename = input("Файл резервной копии: ").strip()
+        if filename:
+            restore_database(filename)
+    elif choice == '8':
+        initialize_database()
+    elif choice == '9':
         print("Выход...")
         return False
     else:
@@ -195,11 +445,100 @@ def show_menu():
     input("\nНажмите Enter для продолжения...")
     return True
 
+def build_parser():
+    """Команды для запуска без интерактивного меню (cron, скрипты)"""
+    parser = argparse.ArgumentParser(description='Утилита для управления базой данных склада')
+    commands = parser.add_subparsers(dest='command')
+    
+    commands.add_parser('check', help='проверить состояние базы данных')
+    commands.add_parser('init', help='применить миграции и создать тестовые данные в пустой базе')
+    backup_parser = commands.add_parser('backup', help='создать резервную копию (online backup)')
+    backup_parser.add_argument('filename', nargs='?', help='файл копии')
+    backup_parser.add_argument('--step-pages', type=int, default=-1,
+                               help='копировать порциями по N страниц')
+    
+    restore_parser = commands.add_parser('restore', help='восстановить базу из резервной копии')
+    restore_parser.add_argument('filename', help='файл копии')
+    restore_parser.add_argument('--yes', action='store_true', help='не запрашивать подтверждение')
+    
+    export_parser = commands.add_parser('export', help='выгрузить таблицы в CSV/NDJSON')
+    export_parser.add_argument('directory', nargs='?', help='каталог для файлов')
+    export_parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    commands.add_parser('repair', help='восстановить/проверить базу данных')
+    commands.add_parser('rebuild-stats', help='пересчитать счетчики статистики')
+    commands.add_parser('rebuild-analytics', help='пересчитать сводки продаж')
+    purge_parser = commands.add_parser('purge-idempotency-keys',
+                                       help='удалить устаревшие ключи идемпотентности API заказов')
+    purge_parser.add_argument('--hours', type=int,
+                              help='старше скольких часов (по умолчанию IDEMPOTENCY_KEY_TTL)')
+    snapshot_parser = commands.add_parser('snapshot', help='сохранить снимок остатков товаров')
+    snapshot_parser.add_argument('--reconcile', action='store_true',
+                                 help='сначала сверить журнал движения с остатками')
+    
+    migrate_parser = commands.add_parser('migrate', help='применить миграции схемы')
+    migrate_parser.add_argument('--target', type=int, help='версия, до которой обновить')
+    
+    import_parser = commands.add_parser('import', help='импортировать товары из CSV/NDJSON')
+    import_parser.add_argument('path', help='путь к файлу')
+    import_parser.add_argument('--format', choices=['csv', 'ndjson'],
+                               help='формат файла (по умолчанию - по расширению)')
+    import_parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE,
+                               help='размер пачки для записи')
+    
+    generate_parser = commands.add_parser('generate', help='сгенерировать синтетические данные')
+    generate_parser.add_argument('--products', type=int, default=10000)
+    generate_parser.add_argument('--orders', type=int, default=10000)
+    generate_parser.add_argument('--users', type=int, default=10)
+    generate_parser.add_argument('--max-lines', type=int, default=5,
+                                 help='максимум позиций в заказе')
+    generate_parser.add_argument('--paid-ratio', type=float, default=0.5,
+                                 help='доля оплаченных заказов')
+    generate_parser.add_argument('--seed', type=int, default=1,
+                                 help='зерно генератора (одинаковое зерно - одинаковые данные)')
+    generate_parser.add_argument('--until', type=datetime.fromisoformat, default=datagen.DEFAULT_UNTIL,
+                                 help='дата последнего заказа, UTC (YYYY-MM-DD)')
+    return parser
+
+def run_command(args):
+    if args.command == 'check':
+        check_database()
+    elif args.command == 'init':
+        initialize_database()
+    elif args.command == 'backup':
+        return 0 if backup_database(args.filename, args.step_pages) else 1
+    elif args.command == 'restore':
+        return 0 if restore_database(args.filename, confirm=not args.yes) else 1
+    elif args.command == 'export':
+        return 0 if export_database(args.directory, args.format) else 1
+    elif args.command == 'repair':
+        repair_database()
+    elif args.command == 'migrate':
+        return 0 if migrate_database(args.target) else 1
+    elif args.command == 'rebuild-stats':
+        return 0 if rebuild_stats() else 1
+    elif args.command == 'rebuild-analytics':
+        return 0 if rebuild_analytics() else 1
+    elif args.command == 'purge-idempotency-keys':
+        return 0 if purge_idempotency_keys(args.hours) else 1
+    elif args.command == 'snapshot':
+        return 0 if take_stock_snapshot(args.reconcile) else 1
+    elif args.command == 'import':
+        result = import_products_file(args.path, args.format, args.chunk_size)
+        return 0 if result is not None else 1
+    elif args.command == 'generate':
+        result = generate_data(args.products, args.orders, args.users,
+                               args.max_lines, args.paid_ratio, args.seed, args.until)
+        return 0 if result is not None else 1
+    return 0
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    sys.exit(run_command(build_parser().parse_args()))
+
 if __name__ == "__main__":
     print("=" * 60)
     print("🚀 ЗАПУСК УТИЛИТЫ ДЛЯ УПРАВЛЕНИЯ БАЗОЙ ДАННЫХ")
     print("=" * 60)
-    print("ℹ️  Основные данные создаются автоматически при запуске app.py")
+    print("ℹ️  Схема и тестовые данные создаются командой: python database.py init")
     print("ℹ️  Эта утилита только проверяет и управляет существующей БД")
     print("=" * 60)
     
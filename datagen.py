@@ -0,0 +1,181 @@
+import itertools
+import random
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+from models.models import db
+from inventory import STATUS_PAID, STATUS_UNPAID
+import search
+import stats
+import catalog
+import ledger
+import analytics
+
+# Генератор синтетических данных для нагрузочного тестирования и стенда.
+# Строки пишутся пакетными executemany большими транзакциями с явными id,
+# поэтому миллион строк создается за секунды. Результат детерминирован при
+# одинаковом seed и пустой базе.
+#
+# На время загрузки снимаются триггеры полнотекстового индекса, счетчиков
+# статистики, версии каталога, журнала движения товара и сводок продаж, а
+# после нее все пересчитываются целиком - это почти вдвое быстрее, чем
+# обновлять их на каждую вставленную строку. Поэтому в журнале движения у
+# сгенерированных данных нет построчных движений: ledger.reconcile() пишет
+# по одному корректирующему движению на товар (остаток после загрузки).
+#
+# Распределения: популярность товаров в заказах убывает по закону Ципфа
+# (несколько "горячих" артикулов и длинный хвост), в заказе от 1 до
+# max_lines разных товаров, доля оплаченных заказов - paid_ratio, даты
+# заказов равномерно распределены по days дням до момента until (UTC, как
+# CURRENT_TIMESTAMP в базе; по умолчанию фиксированный - от часов машины
+# данные не зависят). Остаток товара случайный от 0 до 500 либо
+# фиксированный stock для всех товаров.
+#
+# Если процесс прервать во время загрузки, снятые триггеры восстановит
+# migrations.repair_triggers() (при миграции и "python database.py check").
+
+DEFAULT_PASSWORD = 'generated1'
+DEFAULT_UNTIL = datetime(2026, 1, 1)  # UTC
+CHUNK_SIZE = 50000
+
+CATEGORIES = ['Холодильник', 'Стиральная машина', 'Электрическая плита', 'Микроволновая печь',
+              'Пылесос', 'Электрочайник', 'Кофемашина', 'Блендер', 'Кондиционер', 'Утюг',
+              'Посудомоечная машина', 'Водонагреватель', 'Мультиварка', 'Обогреватель', 'Фен']
+BRANDS = ['Samsung', 'LG', 'Bosch', 'Philips', 'Tefal', 'Electrolux', 'Haier', 'Indesit',
+          'Braun', 'Xiaomi', 'Gorenje', 'Redmond', 'Polaris', 'Scarlett', 'Dyson']
+
+GenerateResult = namedtuple('GenerateResult', 'users products orders lines')
+
+def _max_id(table):
+    return db.session.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM "{table}"')).scalar()
+
+def _insert_chunks(sql, rows, chunk_size):
+    """Пишет строки пачками по chunk_size, каждая пачка - одна транзакция"""
+    connection = db.session.connection()
+    total = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return total
+        connection.exec_driver_sql(sql, chunk)
+        db.session.commit()
+        connection = db.session.connection()
+        total += len(chunk)
+
+# Префиксы имен триггеров производных данных (см. search.py, stats.py,
+# catalog.py, ledger.py, analytics.py)
+SUSPENDED_TRIGGERS = ('product_fts_', 'stats_', 'catalog_', 'stock_', 'analytics_')
+
+@contextmanager
+def _derived_data_suspended():
+    rows = db.session.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+    )).all()
+    triggers = [(name, sql) for name, sql in rows if name.startswith(SUSPENDED_TRIGGERS)]
+    for name, _ in triggers:
+        db.session.execute(text(f'DROP TRIGGER IF EXISTS "{name}"'))
+    db.session.commit()
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        for _, sql in triggers:
+            db.session.execute(text(sql))
+        search.rebuild()
+        stats.rebuild()
+        catalog.rebuild()
+        ledger.reconcile()
+        analytics.rebuild()
+        db.session.commit()
+
+def _zipf_cum_weights(count, skew):
+    cumulative, total = [], 0.0
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** skew
+        cumulative.append(total)
+    return cumulative
+
+def generate(products=10000, orders=10000, users=10, max_lines=5, paid_ratio=0.5,
+             skew=1.1, days=365, seed=1, password=DEFAULT_PASSWORD, stock=None,
+             chunk_size=CHUNK_SIZE, until=DEFAULT_UNTIL):
+    """Добавляет в базу пользователей, товары, заказы и позиции заказов"""
+    with _derived_data_suspended():
+        return _generate(products, orders, users, max_lines, paid_ratio,
+                         skew, days, seed, password, stock, chunk_size, until)
+
+def _generate(products, orders, users, max_lines, paid_ratio, skew, days, seed, password, stock,
+              chunk_size, until):
+    rnd = random.Random(seed)
+    random_float = rnd.random
+    
+    def below(n):
+        return int(random_float() * n)
+    
+    # Пользователи: один хэш пароля на всех, хэширование дорогое
+    user_base = _max_id('user')
+    password_hash = generate_password_hash(password)
+    users_count = _insert_chunks(
+        'INSERT INTO user (id, username, password_hash, role) VALUES (?, ?, ?, ?)',
+        ((user_base + i, f'gen{user_base + i}', password_hash, 'storekeeper')
+         for i in range(1, users + 1)),
+        chunk_size
+    )
+    
+    product_base = _max_id('product')
+    products_count = _insert_chunks(
+        'INSERT INTO product (id, article, name, quantity) VALUES (?, ?, ?, ?)',
+        ((product_base + i,
+          f'GEN-{product_base + i:08d}',
+          f'{CATEGORIES[below(len(CATEGORIES))]} {BRANDS[below(len(BRANDS))]} '
+          f'{"ABCDEFGHKMNPRSTX"[below(16)]}{100 + below(9900)}',
+          below(501) if stock is None else stock)
+         for i in range(1, products + 1)),
+        chunk_size
+    )
+    
+    if not products or not orders:
+        return GenerateResult(users_count, products_count, 0, 0)
+    
+    # Горячие товары выбираются случайно, а не по порядку id
+    product_ids = list(range(product_base + 1, product_base + products + 1))
+    rnd.shuffle(product_ids)
+    cum_weights = _zipf_cum_weights(len(product_ids), skew)
+    
+    order_base = _max_id('order')
+    until = until.replace(microsecond=0)
+    period = days * 24 * 3600
+    line_id = _max_id('order_item')
+    lines = []
+    
+    def order_rows():
+        nonlocal line_id
+        for order_id in range(order_base + 1, order_base + orders + 1):
+            created_at = until - timedelta(seconds=below(period))
+            status = STATUS_PAID if random_float() < paid_ratio else STATUS_UNPAID
+            line_count = min(max_lines, 1 + int(rnd.expovariate(1.0)))
+            chosen = set(rnd.choices(product_ids, cum_weights=cum_weights, k=line_count))
+            for product_id in chosen:
+                line_id += 1
+                lines.append((line_id, order_id, product_id, 1 + below(5)))
+            yield order_id, str(created_at), status
+    
+    orders_count = 0
+    lines_count = 0
+    rows = order_rows()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        connection = db.session.connection()
+        connection.exec_driver_sql('INSERT INTO "order" (id, created_at, status) VALUES (?, ?, ?)', chunk)
+        connection.exec_driver_sql(
+            'INSERT INTO order_item (id, order_id, product_id, quantity) VALUES (?, ?, ?, ?)', lines
+        )
+        db.session.commit()
+        orders_count += len(chunk)
+        lines_count += len(lines)
+        lines.clear()
+    
+    return GenerateResult(users_count, products_count, orders_count, lines_count)
@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Настройка соединений SQLite: PRAGMA из конфигурации применяются к каждому
+# новому соединению пула сразу после подключения.
+
+_ALLOWED = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+def sqlite_pragmas(config):
+    """Список пар (pragma, значение) по ключам SQLITE_* конфигурации"""
+    # busy_timeout первым: переключение journal_mode само ждет блокировку
+    pragmas = [
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT')),
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS')),
+        ('cache_size', config.get('SQLITE_CACHE_SIZE')),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE')),
+        ('temp_store', config.get('SQLITE_TEMP_STORE')),
+    ]
+    result = []
+    for name, value in pragmas:
+        if value is None or value == '':
+            continue
+        if name in _ALLOWED:
+            value = str(value).upper()
+            if value not in _ALLOWED[name]:
+                raise ValueError(f'Недопустимое значение PRAGMA {name}: {value}')
+        else:
+            value = int(value)
+        result.append((name, value))
+    return result
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+def _uses_queue_pool(uri, options):
+    if 'poolclass' in options:
+        return False
+    url = make_url(uri)
+    # Для базы SQLite в памяти Flask-SQLAlchemy выбирает StaticPool
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS с размерами пула DB_*, если движок использует QueuePool"""
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if _uses_queue_pool(config['SQLALCHEMY_DATABASE_URI'], options):
+        for option, key in (('pool_size', 'DB_POOL_SIZE'),
+                            ('max_overflow', 'DB_MAX_OVERFLOW'),
+                            ('pool_timeout', 'DB_POOL_TIMEOUT')):
+            if config.get(key) is not None:
+                options.setdefault(option, config[key])
+    return options
+
+def init_app(app, db):
+    """Подключает применение PRAGMA к движку приложения (только для SQLite)"""
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,143 @@
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Рассылка изменений остатков и статусов заказов подписчикам /events
+# (Server-Sent Events). Брокер живет в памяти процесса: события видят
+# клиенты, подключенные к тому же процессу сервера.
+#
+# Защита от медленных клиентов: у каждого подписчика не очередь, а словарь
+# последних событий по ключу (тип, id) - новое событие о том же товаре
+# заменяет неотправленное старое, поэтому клиент получает только актуальное
+# состояние. Если неотправленных ключей больше max_pending, подписчик
+# получает событие resync (перезагрузить данные) и отключается, а публикация
+# никогда не блокируется.
+#
+# Каждый открытый поток занимает поток обработчика сервера, поэтому
+# обновления включаются настройкой SSE_ENABLED и требуют многопоточного или
+# асинхронного сервера (gunicorn --worker-class gthread или gevent; см.
+# config.py). Поток закрывается через SSE_MAX_LIFETIME секунд, браузер
+# переподключается сам.
+#
+# При завершении процесса (остановка рабочего процесса, перезапуск
+# reloader'ом) брокер закрывает все потоки, иначе выход ждал бы, пока
+# каждый из них доживет до SSE_MAX_LIFETIME.
+
+class Subscriber:
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def push(self, key, event, data):
+        with self.condition:
+            if self.overflowed:
+                return
+            self.pending[key] = (event, data)
+            self.pending.move_to_end(key)
+            if len(self.pending) > self.max_pending:
+                self.overflowed = True
+                self.pending.clear()
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """Список накопившихся (event, data); пустой, если за timeout ничего не пришло"""
+        with self.condition:
+            if not self.pending and not self.overflowed and not self.closed:
+                self.condition.wait(timeout)
+            items = list(self.pending.values())
+            self.pending.clear()
+            return items
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+class Broker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def subscribe(self, max_pending, max_subscribers):
+        """Новый подписчик или None, если достигнут предел подключений или брокер закрыт"""
+        with self._lock:
+            if self._closed or len(self._subscribers) >= max_subscribers:
+                return None
+            subscriber = Subscriber(max_pending)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, key, event, data):
+        """Рассылает событие; key - ключ замены неотправленных событий"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(key, event, data)
+
+    def close_all(self):
+        """Закрывает потоки всех подписчиков и больше не принимает новых"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+broker = Broker()
+
+# Обычный atexit выполняется только после ожидания всех не-фоновых потоков
+# (gunicorn gthread обслуживает запросы именно в них), то есть уже после
+# того, как открытые потоки доживут до конца; _register_atexit срабатывает
+# раньше этого ожидания
+getattr(threading, '_register_atexit', atexit.register)(broker.close_all)
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+def stream(subscriber, heartbeat, lifetime=None):
+    """Генератор тела ответа text/event-stream для подписчика; lifetime - максимум секунд"""
+    deadline = time.monotonic() + lifetime if lifetime else None
+    try:
+        yield 'retry: 3000\n\n'
+        while not subscriber.closed:
+            timeout = heartbeat
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return
+            items = subscriber.wait(timeout)
+            if subscriber.overflowed:
+                yield format_event('resync', {})
+                return
+            if not items:
+                # Комментарий-пульс: держит соединение через прокси и
+                # позволяет заметить отключившегося клиента
+                yield ': ping\n\n'
+                continue
+            yield ''.join(format_event(event, data) for event, data in items)
+    finally:
+        broker.unsubscribe(subscriber)
+
+def publish_product(product_id, quantity, article=None, name=None):
+    data = {'id': product_id, 'quantity': quantity}
+    if article is not None:
+        data.update(article=article, name=name)
+    broker.publish(('product', product_id), 'product', data)
+
+def publish_product_deleted(product_id):
+    broker.publish(('product', product_id), 'product_deleted', {'id': product_id})
+
+def publish_order(order_id, status):
+    broker.publish(('order', order_id), 'order', {'id': order_id, 'status': status})
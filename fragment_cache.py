@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+import catalog
+
+# Кэш отрендеренных фрагментов страниц, зависящих только от каталога товаров
+# (сетка товаров главной страницы). Ключ включает версию каталога
+# (см. catalog.py), поэтому любое изменение товаров - в том числе из другого
+# процесса - делает старые записи недостижимыми; кроме того, маршруты,
+# изменяющие товары, явно очищают кэш своего процесса. Размер ограничен
+# FRAGMENT_CACHE_SIZE записями, при переполнении вытесняется давно не
+# использованная (LRU). Данные пользователя (корзина, сообщения) во
+# фрагменты не попадают и рендерятся на каждый запрос.
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def get_or_render(key, render):
+    """Значение фрагмента по ключу; render() вызывается только при промахе"""
+    max_entries = current_app.config.get('FRAGMENT_CACHE_SIZE', 0)
+    if max_entries <= 0:
+        return render()
+
+    version, _ = catalog.get_version()
+    full_key = (version,) + tuple(key)
+    with _lock:
+        value = _entries.get(full_key)
+        if value is not None:
+            _entries.move_to_end(full_key)
+            return value
+
+    value = render()
+    with _lock:
+        _entries[full_key] = value
+        _entries.move_to_end(full_key)
+        while len(_entries) > max_entries:
+            _entries.popitem(last=False)
+    return value
+
+def invalidate():
+    """Очищает кэш процесса (после изменения товаров)"""
+    with _lock:
+        _entries.clear()
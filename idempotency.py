@@ -0,0 +1,55 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models.models import db, IdempotencyKey
+
+# Идемпотентность API создания заказов. Клиент передает заголовок
+# Idempotency-Key; ключ сохраняется вместе с отпечатком тела запроса и номером
+# созданного заказа в той же транзакции, что и заказ. Повтор с тем же ключом
+# и тем же телом возвращает уже созданный заказ, с другим телом - ошибку.
+# Одновременные повторы разрешает уникальный индекс (user_id, key): вторая
+# транзакция получает IntegrityError, откатывается и отвечает как повтор.
+#
+# Ключ действует IDEMPOTENCY_KEY_TTL секунд: при сохранении нового ключа
+# устаревшие удаляются в той же транзакции (диапазон по индексу created_at),
+# поэтому таблица не растет бесконечно. Вручную - "python database.py
+# purge-idempotency-keys".
+
+MAX_KEY_LENGTH = 100
+
+def fingerprint(payload):
+    """sha256 канонического JSON тела запроса"""
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def lookup(user_id, key):
+    return IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+
+def purge(older_than):
+    """Удаляет ключи, созданные раньше older_than (UTC, без commit); возвращает их число"""
+    return IdempotencyKey.query.filter(IdempotencyKey.created_at < older_than) \
+        .delete(synchronize_session=False)
+
+def expiry_cutoff(ttl=None):
+    """Момент (UTC), раньше которого ключи устарели"""
+    if ttl is None:
+        ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 0)
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=ttl)
+
+def remember(user_id, key, request_fingerprint, order_id):
+    """Сохраняет ключ и фиксирует транзакцию; False, если ключ уже занят"""
+    if current_app.config.get('IDEMPOTENCY_KEY_TTL', 0) > 0:
+        purge(expiry_cutoff())
+    db.session.add(IdempotencyKey(user_id=user_id, key=key,
+                                  fingerprint=request_fingerprint, order_id=order_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+def forget_user(user_id):
+    return IdempotencyKey.query.filter_by(user_id=user_id).delete()
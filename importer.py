@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+from collections import namedtuple
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from models.models import db, Product
+
+# Пакетный импорт товаров из CSV или NDJSON (article,name,quantity).
+# Файл читается потоково, строки накапливаются в пачки, и каждая пачка
+# записывается одним INSERT ... ON CONFLICT: новые артикулы добавляются,
+# для существующих количество увеличивается.
+
+CHUNK_SIZE = 1000
+MAX_ERRORS = 20
+
+ImportResult = namedtuple('ImportResult', 'inserted updated rejected errors')
+
+def detect_format(filename):
+    """Формат по расширению файла: 'ndjson' для .ndjson/.jsonl/.json, иначе 'csv'"""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+def iter_records(stream, fmt):
+    """Построчно отдает пары (номер строки, словарь полей) из текстового потока"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record
+
+def validate(record):
+    """Проверяет запись и возвращает (article, name, quantity) или бросает ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError('некорректная запись')
+    
+    article = str(record.get('article') or '').strip()
+    name = str(record.get('name') or '').strip()
+    if not article or not name:
+        raise ValueError('не заполнены артикул или название')
+    if len(article) > 50 or len(name) > 200:
+        raise ValueError('слишком длинный артикул или название')
+    
+    try:
+        quantity = int(record.get('quantity', 0))
+    except (TypeError, ValueError):
+        raise ValueError('некорректное количество')
+    if quantity < 0:
+        raise ValueError('количество не может быть отрицательным')
+    
+    return article, name, quantity
+
+def upsert_chunk(rows, add_quantity=True):
+    """Записывает пачку (article, name, quantity) одним оператором.
+
+    add_quantity=False оставляет существующие товары без изменений (для
+    первичного заполнения). Возвращает (inserted, updated) по строкам пачки.
+    """
+    merged = {}
+    lines = {}
+    for article, name, quantity in rows:
+        if article in merged:
+            merged[article]['quantity'] += quantity
+        else:
+            merged[article] = {'article': article, 'name': name, 'quantity': quantity}
+        lines[article] = lines.get(article, 0) + 1
+    if not merged:
+        return 0, 0
+    
+    existing = set(db.session.scalars(
+        select(Product.article).where(Product.article.in_(merged))
+    ))
+    
+    stmt = insert(Product).values(list(merged.values()))
+    if add_quantity:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['article'],
+            set_={'quantity': Product.quantity + stmt.excluded.quantity}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['article'])
+    db.session.execute(stmt)
+    
+    inserted = len(merged) - len(existing)
+    updated = sum(lines.values()) - inserted
+    return inserted, updated
+
+def import_products(stream, fmt='csv', chunk_size=CHUNK_SIZE):
+    """Импортирует товары из текстового потока, фиксируя каждую пачку отдельно"""
+    inserted = updated = rejected = 0
+    errors = []
+    chunk = []
+    
+    def flush():
+        nonlocal inserted, updated
+        chunk_inserted, chunk_updated = upsert_chunk(chunk)
+        db.session.commit()
+        inserted += chunk_inserted
+        updated += chunk_updated
+        chunk.clear()
+    
+    for line_no, record in iter_records(stream, fmt):
+        try:
+            chunk.append(validate(record))
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append(f'строка {line_no}: {e}')
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    
+    return ImportResult(inserted, updated, rejected, errors)
+
+def import_file(path, fmt=None, chunk_size=CHUNK_SIZE):
+    with io.open(path, encoding='utf-8-sig', newline='') as stream:
+        return import_products(stream, fmt or detect_format(path), chunk_size)
@@ -0,0 +1,228 @@
+from collections import namedtuple
+from sqlalchemy import insert, update, select, func, bindparam
+from models.models import db, Product, Order, OrderItem
+
+# Операции со складом, общие для корзины и оформления заказов
+
+STATUS_UNPAID = 'неоплачен'
+STATUS_PAID = 'оплачен'
+
+# Позиция, для которой на складе не хватает товара
+Shortage = namedtuple('Shortage', 'product_id article name needed available')
+
+# Результат оплаты одного заказа при пакетной оплате
+PaymentResult = namedtuple('PaymentResult', 'order_id status shortages')
+
+PAYMENT_PAID = 'paid'
+PAYMENT_ALREADY_PAID = 'already_paid'
+PAYMENT_NOT_FOUND = 'not_found'
+PAYMENT_SHORTAGE = 'shortage'
+
+class StockShortage(Exception):
+    """Списание невозможно: для части позиций не хватает товара"""
+
+    def __init__(self, shortages):
+        super().__init__(', '.join(f'{s.article}: нужно {s.needed}, доступно {s.available}'
+                                   for s in shortages))
+        self.shortages = shortages
+
+class UnknownArticles(Exception):
+    """В заказе есть артикулы, которых нет в каталоге"""
+
+    def __init__(self, articles):
+        super().__init__(', '.join(articles))
+        self.articles = articles
+
+def load_products(product_ids):
+    """Загружает товары одним запросом и возвращает словарь id -> Product"""
+    ids = {int(product_id) for product_id in product_ids}
+    if not ids:
+        return {}
+    return {product.id: product for product in Product.query.filter(Product.id.in_(ids))}
+
+def add_order_lines(order_id, lines):
+    """Вставляет позиции заказа одной пакетной операцией.
+
+    lines - последовательность пар (product_id, quantity).
+    """
+    rows = [
+        {'order_id': order_id, 'product_id': product_id, 'quantity': quantity}
+        for product_id, quantity in lines
+    ]
+    if rows:
+        db.session.execute(insert(OrderItem), rows)
+
+def create_order_by_articles(quantities):
+    """Создает неоплаченный заказ по словарю article -> quantity (без commit).
+
+    Товары и остатки проверяются одним запросом, позиции вставляются одной
+    пакетной операцией. Бросает UnknownArticles или StockShortage.
+    """
+    products = {product.article: product
+                for product in Product.query.filter(Product.article.in_(list(quantities)))}
+    unknown = [article for article in quantities if article not in products]
+    if unknown:
+        raise UnknownArticles(unknown)
+    
+    shortages = [Shortage(products[article].id, article, products[article].name,
+                          quantity, products[article].quantity)
+                 for article, quantity in quantities.items()
+                 if products[article].quantity < quantity]
+    if shortages:
+        raise StockShortage(shortages)
+    
+    order = Order(status=STATUS_UNPAID)
+    db.session.add(order)
+    db.session.flush()
+    add_order_lines(order.id, [(products[article].id, quantity)
+                               for article, quantity in quantities.items()])
+    return order
+
+def _order_demand(order_id):
+    """Потребность заказа по товарам: (товар, нужно, доступно) одним запросом"""
+    return db.session.execute(
+        select(Product.id, Product.article, Product.name,
+               func.sum(OrderItem.quantity), Product.quantity)
+        .join(OrderItem, OrderItem.product_id == Product.id)
+        .where(OrderItem.order_id == order_id)
+        .group_by(Product.id)
+    ).all()
+
+def _shortages(demand):
+    return [Shortage(*row) for row in demand if row[4] < row[3]]
+
+def pay_order(order_id):
+    """Отмечает заказ оплаченным и списывает товар в одной транзакции.
+
+    Статус меняется условным UPDATE (только неоплаченный заказ), остатки -
+    одним UPDATE по всем товарам заказа с проверкой quantity >= нужного,
+    поэтому параллельные оплаты не теряют списания. Возвращает False, если
+    заказ уже оплачен; при нехватке товара откатывает транзакцию и бросает
+    StockShortage с перечнем позиций.
+    """
+    paid = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == STATUS_UNPAID)
+        .values(status=STATUS_PAID)
+    )
+    if paid.rowcount == 0:
+        db.session.rollback()
+        return False
+    
+    # После UPDATE заказа SQLite держит блокировку записи, так что остатки
+    # не изменятся между проверкой и списанием
+    demand = _order_demand(order_id)
+    shortages = _shortages(demand)
+    if shortages:
+        db.session.rollback()
+        raise StockShortage(shortages)
+    
+    needed = (
+        select(func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id, OrderItem.product_id == Product.id)
+        .scalar_subquery()
+    )
+    updated = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(select(OrderItem.product_id).where(OrderItem.order_id == order_id)),
+               Product.quantity >= needed)
+        .values(quantity=Product.quantity - needed),
+        execution_options={'synchronize_session': False}
+    )
+    if updated.rowcount != len(demand):
+        # Остатки успели измениться в другой транзакции (СУБД без блокировки)
+        db.session.rollback()
+        raise StockShortage(_shortages(_order_demand(order_id)))
+    
+    db.session.commit()
+    return True
+
+def pay_orders(order_ids):
+    """Оплачивает несколько заказов в одной транзакции с одним commit.
+
+    Неоплаченные заказы захватываются одним условным UPDATE (он же берет
+    блокировку записи), позиции всех заказов читаются одним запросом, товар
+    распределяется по заказам в порядке order_ids: заказ, которому не
+    хватает остатка, остается неоплаченным и не мешает следующим. Остатки
+    списываются одним условным UPDATE на каждый товар. Возвращает список
+    PaymentResult в порядке order_ids (повторы id отбрасываются).
+    """
+    ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    if not ids:
+        return []
+    
+    claimed = set(db.session.scalars(
+        update(Order)
+        .where(Order.id.in_(ids), Order.status == STATUS_UNPAID)
+        .values(status=STATUS_PAID)
+        .returning(Order.id),
+        execution_options={'synchronize_session': False}
+    ))
+    unclaimed = [order_id for order_id in ids if order_id not in claimed]
+    existing = set(db.session.scalars(select(Order.id).where(Order.id.in_(unclaimed)))) if unclaimed else set()
+    
+    demand = {}
+    remaining = {}
+    if claimed:
+        rows = db.session.execute(
+            select(OrderItem.order_id, Product.id, Product.article, Product.name,
+                   func.sum(OrderItem.quantity), Product.quantity)
+            .join(Product, OrderItem.product_id == Product.id)
+            .where(OrderItem.order_id.in_(claimed))
+            .group_by(OrderItem.order_id, Product.id)
+        ).all()
+        for order_id, product_id, article, name, needed, available in rows:
+            demand.setdefault(order_id, []).append((product_id, article, name, needed))
+            remaining[product_id] = available
+    
+    results = []
+    rejected = []
+    totals = {}
+    for order_id in ids:
+        if order_id not in claimed:
+            status = PAYMENT_ALREADY_PAID if order_id in existing else PAYMENT_NOT_FOUND
+            results.append(PaymentResult(order_id, status, []))
+            continue
+        
+        lines = demand.get(order_id, [])
+        shortages = [Shortage(product_id, article, name, needed, remaining[product_id])
+                     for product_id, article, name, needed in lines
+                     if remaining[product_id] < needed]
+        if shortages:
+            rejected.append(order_id)
+            results.append(PaymentResult(order_id, PAYMENT_SHORTAGE, shortages))
+            continue
+        
+        for product_id, _, _, needed in lines:
+            remaining[product_id] -= needed
+            totals[product_id] = totals.get(product_id, 0) + needed
+        results.append(PaymentResult(order_id, PAYMENT_PAID, []))
+    
+    if rejected:
+        db.session.execute(
+            update(Order).where(Order.id.in_(rejected)).values(status=STATUS_UNPAID),
+            execution_options={'synchronize_session': False}
+        )
+    
+    if totals:
+        products = Product.__table__
+        updated = db.session.connection().execute(
+            products.update()
+            .where(products.c.id == bindparam('product_id'),
+                   products.c.quantity >= bindparam('needed'))
+            .values(quantity=products.c.quantity - bindparam('needed')),
+            [{'product_id': product_id, 'needed': needed} for product_id, needed in totals.items()]
+        )
+        if updated.rowcount != len(totals):
+            # Остатки успели измениться в другой транзакции (СУБД без блокировки)
+            db.session.rollback()
+            current = load_products(totals)
+            raise StockShortage([
+                Shortage(product_id, current[product_id].article, current[product_id].name,
+                         needed, current[product_id].quantity)
+                for product_id, needed in totals.items()
+                if product_id in current and current[product_id].quantity < needed
+            ])
+    
+    db.session.commit()
+    return results
@@ -0,0 +1,192 @@
+from sqlalchemy import text, select, update, func
+from models.models import db, StockMovement, StockSnapshot, StockSnapshotItem
+
+# Журнал движения товара и снимки остатков.
+#
+# Каждое изменение Product.quantity - добавление товара, поступление,
+# списание при оплате, импорт, удаление - триггеры записывают в
+# stock_movement в той же транзакции (delta и остаток после движения).
+# Журнал только дополняется, поэтому по нему восстанавливается остаток на
+# любой момент времени.
+#
+# Чтобы не суммировать весь журнал, периодически ("python database.py
+# snapshot", например из cron) сохраняется снимок остатков всех товаров.
+# Остаток на момент D = ближайший снимок не позже D + сумма движений после
+# снимка до D, то есть просматриваются только движения с последнего снимка.
+
+KIND_CREATE = 'create'
+KIND_RECEIPT = 'receipt'
+KIND_ISSUE = 'issue'
+KIND_DELETE = 'delete'
+KIND_OPENING = 'opening'
+KIND_ADJUSTMENT = 'adjustment'
+
+def _movement(product, delta, balance, kind):
+    return (f"INSERT INTO stock_movement(product_id, delta, balance, kind, created_at) "
+            f"VALUES ({product}, {delta}, {balance}, {kind}, CURRENT_TIMESTAMP);")
+
+LEDGER_SCHEMA = [
+    f"""CREATE TRIGGER IF NOT EXISTS stock_product_insert AFTER INSERT ON product
+    WHEN NEW.quantity <> 0 BEGIN
+        {_movement('NEW.id', 'NEW.quantity', 'NEW.quantity', repr(KIND_CREATE))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stock_product_quantity AFTER UPDATE OF quantity ON product
+    WHEN NEW.quantity IS NOT OLD.quantity BEGIN
+        {_movement('NEW.id', 'NEW.quantity - OLD.quantity', 'NEW.quantity',
+                   f"CASE WHEN NEW.quantity > OLD.quantity THEN '{KIND_RECEIPT}' ELSE '{KIND_ISSUE}' END")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stock_product_delete AFTER DELETE ON product
+    WHEN OLD.quantity <> 0 BEGIN
+        {_movement('OLD.id', '-OLD.quantity', '0', repr(KIND_DELETE))}
+    END""",
+]
+
+def install():
+    """Создает триггеры; для уже существующих товаров записывает начальные остатки и первый снимок (без commit)"""
+    for statement in LEDGER_SCHEMA:
+        db.session.execute(text(statement))
+    if db.session.query(StockMovement.id).first() is None:
+        reconcile(KIND_OPENING)
+        take_snapshot()
+
+def _nearest_snapshot(at=None):
+    query = select(StockSnapshot).order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc()).limit(1)
+    if at is not None:
+        query = query.where(StockSnapshot.taken_at <= at)
+    return db.session.scalars(query).first()
+
+def _next_snapshot_bound(at):
+    """last_movement_id первого снимка позже at: все движения до at не новее его"""
+    return db.session.scalar(
+        select(StockSnapshot.last_movement_id)
+        .where(StockSnapshot.taken_at > at)
+        .order_by(StockSnapshot.taken_at, StockSnapshot.id)
+        .limit(1)
+    )
+
+def _product_key():
+    # "+ 0" не дает планировщику группировать по индексу (product_id, id):
+    # иначе SQLite обходит весь индекс журнала вместо диапазона первичного ключа
+    return (StockMovement.product_id + 0).label('product_id')
+
+def _balances(at=None, product_ids=None):
+    """Остатки на момент at (None - текущие по журналу): (снимок, {product_id: остаток})"""
+    snapshot = _nearest_snapshot(at)
+    balances = {}
+
+    if snapshot is not None:
+        items = select(StockSnapshotItem.product_id, StockSnapshotItem.quantity) \
+            .where(StockSnapshotItem.snapshot_id == snapshot.id)
+        if product_ids is not None:
+            items = items.where(StockSnapshotItem.product_id.in_(product_ids))
+        balances.update(db.session.execute(items).all())
+
+    # Движения после снимка - диапазон первичного ключа; для прошлого момента
+    # он ограничен сверху следующим снимком
+    key = _product_key()
+    deltas = select(key, func.sum(StockMovement.delta)) \
+        .where(StockMovement.id > (snapshot.last_movement_id if snapshot else 0)) \
+        .group_by(key)
+    if at is not None:
+        deltas = deltas.where(StockMovement.created_at <= at)
+        upper = _next_snapshot_bound(at)
+        if upper is not None:
+            deltas = deltas.where(StockMovement.id <= upper)
+    if product_ids is not None:
+        deltas = deltas.where(StockMovement.product_id.in_(product_ids))
+    for product_id, delta in db.session.execute(deltas):
+        balances[product_id] = balances.get(product_id, 0) + delta
+
+    return snapshot, {product_id: quantity for product_id, quantity in balances.items() if quantity}
+
+def stock_at(at, product_ids=None):
+    """Остатки товаров на момент at: (снимок-основа или None, {product_id: остаток})"""
+    return _balances(at, product_ids)
+
+def movement_summary(start, end, product_ids=None):
+    """Движение за период (start, end] по товарам: остаток на начало, приход, расход, остаток на конец"""
+    base, opening = _balances(start, product_ids)
+    _, closing = _balances(end, product_ids)
+
+    key = _product_key()
+    query = select(key,
+                   func.sum(func.max(StockMovement.delta, 0)),
+                   func.sum(func.min(StockMovement.delta, 0))) \
+        .where(StockMovement.created_at > start, StockMovement.created_at <= end) \
+        .group_by(key)
+    # Движения позже start новее снимка-основы start, а движения до end не
+    # новее следующего после end снимка - тоже диапазон первичного ключа
+    if base is not None:
+        query = query.where(StockMovement.id > base.last_movement_id)
+    upper = _next_snapshot_bound(end)
+    if upper is not None:
+        query = query.where(StockMovement.id <= upper)
+    if product_ids is not None:
+        query = query.where(StockMovement.product_id.in_(product_ids))
+    moved = {product_id: (receipts, -issues) for product_id, receipts, issues in db.session.execute(query)}
+
+    summary = {}
+    for product_id in set(opening) | set(closing) | set(moved):
+        receipts, issues = moved.get(product_id, (0, 0))
+        summary[product_id] = {
+            'opening': opening.get(product_id, 0),
+            'receipts': receipts,
+            'issues': issues,
+            'closing': closing.get(product_id, 0),
+        }
+    return summary
+
+def product_movements(product_id, start=None, end=None, limit=100):
+    """Движения одного товара, новые первыми"""
+    query = select(StockMovement).where(StockMovement.product_id == product_id) \
+        .order_by(StockMovement.id.desc()).limit(limit)
+    if start is not None:
+        query = query.where(StockMovement.created_at > start)
+    if end is not None:
+        query = query.where(StockMovement.created_at <= end)
+    return db.session.scalars(query).all()
+
+def take_snapshot():
+    """Сохраняет снимок текущих остатков (без commit); возвращает StockSnapshot"""
+    # Сначала запись - она берет блокировку, и журнал и остатки не
+    # изменятся, пока читаем номер последнего движения и товары
+    snapshot = StockSnapshot(last_movement_id=0)
+    db.session.add(snapshot)
+    db.session.flush()
+    db.session.execute(
+        update(StockSnapshot)
+        .where(StockSnapshot.id == snapshot.id)
+        .values(last_movement_id=select(func.coalesce(func.max(StockMovement.id), 0)).scalar_subquery()),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(text(
+        "INSERT INTO stock_snapshot_item(snapshot_id, product_id, quantity) "
+        "SELECT :snapshot_id, id, quantity FROM product WHERE quantity <> 0"
+    ), {'snapshot_id': snapshot.id})
+    db.session.refresh(snapshot)
+    return snapshot
+
+def reconcile(kind=KIND_ADJUSTMENT):
+    """Сверяет журнал с остатками и дописывает корректирующие движения (без commit).
+
+    Нужна после изменений в обход триггеров (массовая загрузка); возвращает
+    число записанных движений.
+    """
+    _, balances = _balances()
+    quantities = dict(db.session.execute(text("SELECT id, quantity FROM product")).all())
+    rows = [
+        {'product_id': product_id, 'delta': quantities.get(product_id, 0) - balance,
+         'balance': quantities.get(product_id, 0), 'kind': kind}
+        for product_id, balance in balances.items()
+        if quantities.get(product_id, 0) != balance
+    ] + [
+        {'product_id': product_id, 'delta': quantity, 'balance': quantity, 'kind': kind}
+        for product_id, quantity in quantities.items()
+        if quantity and product_id not in balances
+    ]
+    if rows:
+        db.session.execute(text(
+            "INSERT INTO stock_movement(product_id, delta, balance, kind, created_at) "
+            "VALUES (:product_id, :delta, :balance, :kind, CURRENT_TIMESTAMP)"
+        ), rows)
+    return len(rows)
@@ -0,0 +1,130 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import has_request_context, request, session
+
+# Логирование приложения. Записи из обработчиков только кладутся в очередь
+# (QueueHandler), а форматирование и вывод в поток/файл выполняет отдельный
+# поток QueueListener, поэтому запрос не ждет ввода-вывода. При переполнении
+# очереди записи отбрасываются, а не блокируют запрос. Уровень, формат
+# (json - одна JSON-строка на запись, text - для чтения глазами) и файл
+# берутся из конфигурации LOG_*.
+
+# Атрибуты LogRecord, которые не являются пользовательскими полями extra=
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= попадают в запись как есть"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Читаемый формат: поля extra= выводятся после сообщения как key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f'{key}={value}' for key, value in record.__dict__.items()
+                          if key not in _RESERVED and not key.startswith('_'))
+        if not fields:
+            return line
+        head, sep, tail = line.partition('\n')
+        return f'{head} {fields}{sep}{tail}'
+
+class RequestQueueHandler(QueueHandler):
+    """Кладет запись в очередь, дополнив ее данными текущего запроса"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Сообщение и трассировку вычисляем здесь: аргументы и объекты
+        # исключения нельзя передавать в другой поток
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context():
+            record.__dict__.setdefault('method', request.method)
+            record.__dict__.setdefault('path', request.path)
+            record.__dict__.setdefault('user_id', session.get('user_id'))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            RequestQueueHandler.dropped += 1
+
+_listener = None
+_handler = None
+
+def init_app(app):
+    """Настраивает корневой логгер по LOG_* конфигурации приложения"""
+    global _listener, _handler
+    shutdown()
+
+    if app.config.get('LOG_FORMAT', 'json') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter()
+
+    log_file = app.config.get('LOG_FILE')
+    output = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    records = queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000))
+    _handler = RequestQueueHandler(records)
+    _listener = QueueListener(records, output, respect_handler_level=False)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    _listener.start()
+
+def shutdown():
+    """Дописывает оставшиеся в очереди записи и останавливает поток вывода"""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def _restart_after_fork():
+    # Потоки не переживают fork: при предзагрузке приложения в мастер-процессе
+    # (gunicorn --preload) каждому рабочему процессу нужен свой поток вывода
+    # и своя очередь (записи родителя, не успевшие выйти, не дублируются)
+    global _listener
+    if _listener is not None and _handler is not None:
+        records = queue.Queue(_handler.queue.maxsize)
+        _handler.queue = records
+        _listener = QueueListener(records, *_listener.handlers, respect_handler_level=False)
+        _listener.start()
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_restart_after_fork)
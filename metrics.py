@@ -0,0 +1,173 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Метрики производительности запросов. Для каждого endpoint собираются
+# гистограммы времени ответа, числа SQL-запросов и их суммарного времени
+# (события движка SQLAlchemy), времени рендеринга шаблонов и размера ответа.
+# Результат отдается на /metrics в текстовом формате Prometheus; при
+# METRICS_SERVER_TIMING те же замеры добавляются в заголовок Server-Timing.
+# Значения хранятся в памяти процесса: при нескольких процессах сервера
+# каждый отдает свои гистограммы.
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """Гистограмма с метками, потокобезопасная"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            base = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = base + ',' if base else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {_format(total)}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Время обработки запроса',
+                            ('endpoint', 'method', 'status'), SECONDS_BUCKETS)
+SQL_QUERIES = Histogram('http_request_sql_queries', 'Число SQL-запросов за запрос',
+                        ('endpoint',), QUERY_BUCKETS)
+SQL_SECONDS = Histogram('http_request_sql_duration_seconds', 'Суммарное время SQL-запросов за запрос',
+                        ('endpoint',), SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram('http_request_template_duration_seconds', 'Время рендеринга шаблонов',
+                             ('endpoint',), SECONDS_BUCKETS)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Размер тела ответа',
+                           ('endpoint',), SIZE_BUCKETS)
+
+HISTOGRAMS = [REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, TEMPLATE_SECONDS, RESPONSE_BYTES]
+
+class RequestTimings:
+    """Замеры одного запроса (хранятся в g)"""
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'template_seconds', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_started = None
+
+def _timings():
+    if not has_request_context():
+        return None
+    return g.get('_request_timings')
+
+def render_metrics():
+    """Все гистограммы в текстовом формате Prometheus"""
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+def server_timing(timings, elapsed):
+    return (f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_count} queries", '
+            f'tpl;dur={timings.template_seconds * 1000:.1f}')
+
+def init_app(app, db):
+    """Подключает сбор метрик ко всем маршрутам приложения и регистрирует /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    add_server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def sql_started(conn, cursor, statement, parameters, context, executemany):
+        if _timings() is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def sql_finished(conn, cursor, statement, parameters, context, executemany):
+        timings = _timings()
+        started = getattr(context, '_metrics_started', None)
+        if timings is not None and started is not None:
+            timings.sql_count += 1
+            timings.sql_seconds += time.perf_counter() - started
+
+    def template_started(sender, template, context, **extra):
+        timings = _timings()
+        if timings is not None:
+            timings.template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        timings = _timings()
+        if timings is not None and timings.template_started is not None:
+            timings.template_seconds += time.perf_counter() - timings.template_started
+            timings.template_started = None
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.before_request
+    def start_timings():
+        if request.endpoint != 'metrics':
+            g._request_timings = RequestTimings()
+
+    @app.after_request
+    def record_timings(response):
+        timings = g.pop('_request_timings', None)
+        if timings is None:
+            return response
+        elapsed = time.perf_counter() - timings.started
+        endpoint = request.endpoint or 'none'
+
+        REQUEST_SECONDS.observe((endpoint, request.method, str(response.status_code)), elapsed)
+        SQL_QUERIES.observe((endpoint,), timings.sql_count)
+        SQL_SECONDS.observe((endpoint,), timings.sql_seconds)
+        TEMPLATE_SECONDS.observe((endpoint,), timings.template_seconds)
+        if not response.is_streamed:
+            size = response.calculate_content_length()
+            if size is not None:
+                RESPONSE_BYTES.observe((endpoint,), size)
+
+        if add_server_timing:
+            response.headers['Server-Timing'] = server_timing(timings, elapsed)
+        return response
+
+    def metrics():
+        return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
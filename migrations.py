@@ -0,0 +1,141 @@
+import logging
+import re
+from sqlalchemy import text
+from models.models import (db, IdempotencyKey, StockMovement, StockSnapshot, StockSnapshotItem,
+                           SalesDaily, SalesProductDaily)
+import search
+import stats
+import catalog
+import ledger
+import analytics
+
+# Версионные миграции схемы. Номер примененной версии хранится в
+# PRAGMA user_version файла базы; при запуске приложения и командой
+# "python database.py migrate" применяются все более новые шаги по порядку.
+#
+# Шаги идемпотентны (IF NOT EXISTS, проверка наличия колонок), поэтому их
+# безопасно применять и к новой базе, и к базе, созданной старой версией
+# приложения. Шаги не фиксируют транзакцию сами: upgrade() выполняет их в
+# одной транзакции BEGIN IMMEDIATE и перечитывает версию уже под блокировкой
+# записи, поэтому при одновременном старте нескольких процессов миграции
+# применяет один, а остальные ждут и видят новую версию. Данные миграции не
+# удаляют. Новый шаг добавляется в конец списка MIGRATIONS.
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать блокировку, пока миграции применяет другой процесс, мс
+LOCK_TIMEOUT = 120000
+
+def _execute(*statements):
+    for statement in statements:
+        db.session.execute(text(statement))
+
+def has_column(table, column):
+    rows = db.session.execute(text(f'PRAGMA table_info("{table}")')).all()
+    return any(row[1] == column for row in rows)
+
+def _create_tables():
+    # На соединении сессии: db.create_all() открыл бы свое и ждал нашу блокировку
+    db.metadata.create_all(db.session.connection())
+
+def _hot_query_indexes():
+    _execute(
+        'CREATE INDEX IF NOT EXISTS ix_order_created_at ON "order" (created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_order_status ON "order" (status)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_order_id ON order_item (order_id)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_product_id ON order_item (product_id)',
+    )
+
+def _idempotency_keys():
+    IdempotencyKey.__table__.create(db.session.connection(), checkfirst=True)
+
+def _stock_ledger():
+    connection = db.session.connection()
+    for model in (StockMovement, StockSnapshot, StockSnapshotItem):
+        model.__table__.create(connection, checkfirst=True)
+    ledger.install()
+
+def _sales_rollups():
+    connection = db.session.connection()
+    for model in (SalesDaily, SalesProductDaily):
+        model.__table__.create(connection, checkfirst=True)
+    analytics.install()
+
+MIGRATIONS = [
+    (1, 'Таблицы по моделям', _create_tables),
+    (2, 'Индексы для списка заказов, статистики и удаления товаров', _hot_query_indexes),
+    (3, 'Полнотекстовый индекс товаров', search.install),
+    (4, 'Счетчики статистики', stats.install),
+    (5, 'Версия каталога для условных ответов API', catalog.install),
+    (6, 'Ключи идемпотентности API заказов', _idempotency_keys),
+    (7, 'Журнал движения товара и снимки остатков', _stock_ledger),
+    (8, 'Сводки продаж по дням и товарам', _sales_rollups),
+]
+
+# Триггеры производных данных: (версия, в которой они созданы, схема,
+# пересчет данных). Триггеры снимаются на время массовой загрузки (datagen);
+# если загрузку прервали, upgrade() и проверка базы создают их заново и
+# пересчитывают данные, пропустившие изменения.
+DERIVED_DATA = [
+    (3, search.FTS_SCHEMA, search.rebuild),
+    (4, stats.STATS_SCHEMA, stats.rebuild),
+    (5, catalog.CATALOG_SCHEMA, catalog.rebuild),
+    (7, ledger.LEDGER_SCHEMA, ledger.reconcile),
+    (8, analytics.ANALYTICS_SCHEMA, analytics.rebuild),
+]
+
+_TRIGGER_NAME = re.compile(r'CREATE TRIGGER IF NOT EXISTS (\w+)')
+
+def repair_triggers():
+    """Создает недостающие триггеры производных данных (без commit); возвращает их имена"""
+    version = current_version()
+    existing = set(db.session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+    )).scalars())
+    repaired = []
+    for number, schema, rebuild in DERIVED_DATA:
+        if number > version:
+            continue
+        names = [match.group(1) for match in map(_TRIGGER_NAME.search, schema) if match]
+        missing = [name for name in names if name not in existing]
+        if missing:
+            for statement in schema:
+                db.session.execute(text(statement))
+            rebuild()
+            repaired.extend(missing)
+    if repaired:
+        logger.warning('Восстановлены триггеры производных данных', extra={'triggers': repaired})
+    return repaired
+
+def current_version():
+    return db.session.execute(text('PRAGMA user_version')).scalar()
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+def _set_version(version):
+    db.session.execute(text(f'PRAGMA user_version = {int(version)}'))
+
+def upgrade(target=None):
+    """Применяет миграции новее текущей версии; возвращает список примененных"""
+    target = latest_version() if target is None else target
+    connection = db.session.connection()
+    busy_timeout = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+    connection.exec_driver_sql(f'PRAGMA busy_timeout = {LOCK_TIMEOUT}')
+    try:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+        version = current_version()
+        applied = []
+        for number, description, step in MIGRATIONS:
+            if version < number <= target:
+                step()
+                _set_version(number)
+                applied.append((number, description))
+        repair_triggers()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.connection().exec_driver_sql(f'PRAGMA busy_timeout = {busy_timeout}')
+    return applied
@@ -24,12 +24,81 @@ class Product(db.Model):
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    status = db.Column(db.String(20), default='неоплачен')  # 'неоплачен' или 'оплачен'
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+    status = db.Column(db.String(20), default='неоплачен', index=True)  # 'неоплачен' или 'оплачен'
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+class CartItem(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'product_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+# Ключи идемпотентности API создания заказов (см. idempotency.py)
+class IdempotencyKey(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 тела запроса
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+
+# Журнал движения товара: пишется триггерами на каждое изменение остатка
+# (см. ledger.py), строки только добавляются. product_id без внешнего ключа -
+# история удаленных товаров сохраняется.
+class StockMovement(db.Model):
+    __table_args__ = (db.Index('ix_stock_movement_product_id_id', 'product_id', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)  # остаток после движения
+    kind = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+
+# Снимок остатков всех товаров: остаток на момент после движения last_movement_id
+class StockSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+
+class StockSnapshotItem(db.Model):
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('stock_snapshot.id'), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+# Сводки продаж по дням, поддерживаются триггерами (см. analytics.py)
+class SalesDaily(db.Model):
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD
+    status = db.Column(db.String(20), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+class SalesProductDaily(db.Model):
+    day = db.Column(db.String(10), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+# Счетчики статистики, поддерживаются триггерами (см. stats.py)
+class StatCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+# Количество позиций заказа коррелированным подзапросом, без загрузки коллекции items
+Order.items_count = db.column_property(
+    db.select(db.func.count(OrderItem.id))
+    .where(OrderItem.order_id == Order.id)
+    .correlate_except(OrderItem)
+    .scalar_subquery(),
+    deferred=True
+)
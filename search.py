@@ -0,0 +1,75 @@
+import re
+from sqlalchemy import text
+from models.models import db
+
+# Полнотекстовый поиск товаров по названию и артикулу (SQLite FTS5).
+# Индекс product_fts - external content таблица поверх product; триггеры
+# поддерживают его в актуальном состоянии при любых INSERT/UPDATE/DELETE,
+# в том числе при добавлении, удалении и первичном заполнении товаров.
+
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, article, content='product', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, article) VALUES (new.id, new.name, new.article);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, article)
+        VALUES ('delete', old.id, old.name, old.article);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF name, article ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, article)
+        VALUES ('delete', old.id, old.name, old.article);
+        INSERT INTO product_fts(rowid, name, article) VALUES (new.id, new.name, new.article);
+    END""",
+]
+
+def install():
+    """Создает индекс и триггеры; для уже заполненной базы строит индекс заново (без commit)"""
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+    )).first()
+    for statement in FTS_SCHEMA:
+        db.session.execute(text(statement))
+    if not exists:
+        rebuild()
+
+def rebuild():
+    """Перестраивает индекс по текущему содержимому таблицы product"""
+    db.session.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+def build_match_query(query):
+    """Превращает пользовательский ввод в запрос FTS5.
+
+    Каждое слово становится фразой с поиском по префиксу, слова объединяются
+    по И: "RF-10 samsung" -> "RF-10"* "samsung"*. Спецсинтаксис FTS5 из ввода
+    не интерпретируется.
+    """
+    terms = [term.replace('"', '') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms if re.search(r'\w', term))
+
+def search_products(query, limit, after=None):
+    """Товары по релевантности (bm25), keyset-пагинация по паре (rank, id).
+
+    after - (rank, id) последней показанной строки. Возвращает (rows, has_more),
+    строки содержат id, article, name, quantity и rank.
+    """
+    match = build_match_query(query)
+    if not match:
+        return [], False
+    
+    params = {'match': match, 'limit': limit + 1}
+    keyset = ''
+    if after:
+        keyset = 'AND (product_fts.rank > :rank OR (product_fts.rank = :rank AND product_fts.rowid > :id))'
+        params['rank'], params['id'] = after
+    
+    rows = db.session.execute(text(f"""
+        SELECT product.id, product.article, product.name, product.quantity, product_fts.rank AS rank
+        FROM product_fts JOIN product ON product.id = product_fts.rowid
+        WHERE product_fts MATCH :match {keyset}
+        ORDER BY product_fts.rank, product_fts.rowid
+        LIMIT :limit
+    """), params).all()
+    return rows[:limit], len(rows) > limit
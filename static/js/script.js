@@ -1,20 +1,19 @@
 document.addEventListener('DOMContentLoaded', function() {
-    let currentPage = 1;
-    let totalPages = parseInt(document.getElementById('total-pages').textContent) || 1;
     const productsContainer = document.getElementById('products-container');
     const loadMoreBtn = document.getElementById('load-more-btn');
     const loadingIndicator = document.getElementById('loading-indicator');
     const noMoreProducts = document.getElementById('no-more-products');
-    const currentPageSpan = document.getElementById('current-page');
+    const nextPageLink = document.getElementById('next-page-link');
     const shownProductsSpan = document.getElementById('shown-products');
-    let totalShownProducts = parseInt(document.querySelectorAll('.product-card').length);
-    
-    // Инициализация показанного количества товаров
-    updateShownProductsCount();
+    // Непрозрачный курсор следующей страницы (keyset-пагинация)
+    let nextCursor = loadMoreBtn ? loadMoreBtn.dataset.nextCursor : null;
+    let totalShownProducts = document.querySelectorAll('.product-card').length;
     
     // Обработчик кнопки "Загрузить еще"
-    if (loadMoreBtn) {
+    if (loadMoreBtn && productsContainer) {
         loadMoreBtn.addEventListener('click', loadMoreProducts);
+        // С подгрузкой по кнопке ссылка "Вперед" больше не нужна
+        if (nextPageLink) nextPageLink.style.display = 'none';
     }
     
     // Функция обновления счетчика показанных товаров
@@ -24,26 +23,26 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    function showNoMoreProducts() {
+        if (loadMoreBtn) loadMoreBtn.style.display = 'none';
+        if (noMoreProducts) noMoreProducts.style.display = 'block';
+    }
+    
     // Функция загрузки следующих товаров
     function loadMoreProducts() {
-        if (currentPage >= totalPages) {
-            if (loadMoreBtn) loadMoreBtn.style.display = 'none';
-            if (noMoreProducts) noMoreProducts.style.display = 'block';
+        if (!nextCursor) {
+            showNoMoreProducts();
             return;
         }
         
-        currentPage++;
-        
-        if (loadMoreBtn) {
-            loadMoreBtn.disabled = true;
-            loadMoreBtn.textContent = 'Загрузка...';
-        }
+        loadMoreBtn.disabled = true;
+        loadMoreBtn.textContent = 'Загрузка...';
         
         if (loadingIndicator) {
             loadingIndicator.style.display = 'block';
         }
         
-        fetch(`/load_more_products?page=${currentPage}`)
+        fetch(`/load_more_products?after_id=${encodeURIComponent(nextCursor)}`)
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
@@ -51,7 +50,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 return response.json();
             })
             .then(data => {
-                if (data.success && data.products && data.products.length > 0) {
+                if (data.success && data.products) {
                     // Добавляем новые товары в контейнер
                     data.products.forEach(product => {
                         const isAvailable = product.quantity > 0;
@@ -60,25 +59,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         totalShownProducts++;
                     });
                     
-                    // Обновляем счетчики
-                    if (currentPageSpan) {
-                        currentPageSpan.textContent = currentPage;
-                    }
-                    
                     updateShownProductsCount();
                     
-                    // Если больше нет товаров, скрываем кнопку
-                    if (!data.has_more) {
-                        if (loadMoreBtn) loadMoreBtn.style.display = 'none';
-                        if (noMoreProducts) noMoreProducts.style.display = 'block';
+                    nextCursor = data.has_more ? data.next_cursor : null;
+                    if (!nextCursor) {
+                        showNoMoreProducts();
                     }
-                    
-                    // Добавляем обработчики событий к новым формам
-                    addEventListenersToNewForms();
-                } else if (data.products && data.products.length === 0) {
-                    // Нет больше товаров
-                    if (loadMoreBtn) loadMoreBtn.style.display = 'none';
-                    if (noMoreProducts) noMoreProducts.style.display = 'block';
                 }
             })
             .catch(error => {
@@ -86,17 +72,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 alert('Ошибка при загрузке товаров. Пожалуйста, попробуйте снова.');
             })
             .finally(() => {
-                if (loadMoreBtn) {
-                    loadMoreBtn.disabled = false;
-                    loadMoreBtn.textContent = 'Загрузить еще товары';
-                }
+                loadMoreBtn.disabled = false;
+                loadMoreBtn.textContent = 'Загрузить еще товары';
                 if (loadingIndicator) {
                     loadingIndicator.style.display = 'none';
                 }
             });
     }
     
-    // Функция создания HTML карточки товара
+    // Функция создания HTML карточки товара (та же разметка, что в index.html)
     function createProductCard(product, isAvailable) {
         return `
             <div class="product-card" data-product-id="${product.id}">
@@ -105,7 +89,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 <p><strong>Количество:</strong> <span class="product-quantity">${product.quantity}</span> шт.</p>
                 
                 ${isAvailable ? 
-                    `<form class="add-to-cart-form">
+                    `<form method="POST" action="/add_to_cart">
                         <input type="hidden" name="product_id" value="${product.id}">
                         <div class="quantity-control">
                             <label for="quantity_${product.id}">Количество:</label>
@@ -117,9 +101,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     `<p class="out-of-stock">Нет в наличии</p>`
                 }
                 
-                <form method="POST" action="/delete_product/${product.id}" 
-                      onsubmit="return confirm('Удалить товар ${escapeHtml(product.name)}?');" class="delete-form">
-                    <button type="submit" class="btn btn-danger">Удалить</button>
+                <form method="POST" action="/delete_product/${product.id}" style="display: inline;">
+                    <button type="submit" class="btn btn-danger btn-sm" 
+                            onclick="return confirm('Вы уверены, что хотите удалить этот товар?')">
+                        Удалить
+                    </button>
                 </form>
             </div>`;
     }
@@ -302,12 +288,72 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Инициализация обработчиков событий
-    addEventListenersToForms();
+    // Живые обновления остатков и статусов заказов (Server-Sent Events):
+    // сервер присылает изменения, страница правится на месте без перезагрузки
+    const ordersList = document.querySelector('.orders-list');
     
-    // Автоматически скрываем кнопку "Загрузить еще", если все товары уже показаны
-    if (currentPage >= totalPages && loadMoreBtn) {
-        loadMoreBtn.style.display = 'none';
-        if (noMoreProducts) noMoreProducts.style.display = 'block';
+    function applyProductUpdate(product) {
+        const card = document.querySelector(`.product-card[data-product-id="${product.id}"]`);
+        if (!card) return;
+        
+        const quantityElement = card.querySelector('.product-quantity');
+        if (quantityElement) quantityElement.textContent = product.quantity;
+        
+        const inputElement = card.querySelector('input[name="quantity"]');
+        const outOfStock = card.querySelector('.out-of-stock');
+        if (product.quantity > 0 && inputElement) {
+            inputElement.max = product.quantity;
+        } else if (product.quantity > 0 && outOfStock && product.name !== undefined) {
+            // Товар снова в наличии: карточка целиком с формой добавления в корзину
+            card.outerHTML = createProductCard(product, true);
+        } else if (product.quantity <= 0 && inputElement) {
+            inputElement.closest('form').outerHTML = '<p class="out-of-stock">Нет в наличии</p>';
+        }
     }
+    
+    function applyProductDeleted(product) {
+        const card = document.querySelector(`.product-card[data-product-id="${product.id}"]`);
+        if (card) {
+            card.remove();
+            totalShownProducts = Math.max(0, totalShownProducts - 1);
+            updateShownProductsCount();
+        }
+    }
+    
+    function applyOrderUpdate(order) {
+        const card = document.querySelector(`.order-card[data-order-id="${order.id}"]`);
+        if (!card) return;
+        
+        const paid = order.status === 'оплачен';
+        card.classList.toggle('paid', paid);
+        card.classList.toggle('unpaid', !paid);
+        
+        const statusElement = card.querySelector('.order-status');
+        if (statusElement) {
+            statusElement.textContent = order.status;
+            statusElement.className = `order-status status-${order.status}`;
+        }
+        if (paid) {
+            card.querySelectorAll('.order-actions, input[name="order_ids"]').forEach(el => el.remove());
+        }
+    }
+    
+    // Поток включается на сервере (SSE_ENABLED), см. атрибут data-live-updates
+    const liveUpdates = document.body.hasAttribute('data-live-updates');
+    if (liveUpdates && window.EventSource && (productsContainer || ordersList)) {
+        const source = new EventSource('/events');
+        const handle = (handler) => (event) => handler(JSON.parse(event.data));
+        
+        source.addEventListener('product', handle(applyProductUpdate));
+        source.addEventListener('product_deleted', handle(applyProductDeleted));
+        source.addEventListener('order', handle(applyOrderUpdate));
+        // Клиент не успевал за событиями - проще перечитать страницу целиком
+        source.addEventListener('resync', () => {
+            source.close();
+            window.location.reload();
+        });
+    }
+    
+    // Инициализация обработчиков событий
+    addEventListenersToForms();
 });
\ No newline at end of file
@@ -0,0 +1,71 @@
+from sqlalchemy import text
+from models.models import db, StatCounter
+from inventory import STATUS_UNPAID, STATUS_PAID
+
+# Статистика без полных подсчетов: количество пользователей, товаров и заказов
+# (всего и по статусам) хранится в таблице stat_counter и обновляется
+# триггерами в той же транзакции, что и изменение данных. Чтение - один
+# запрос по первичному ключу независимо от размера таблиц.
+
+def _bump(name, delta):
+    return (f"INSERT INTO stat_counter(name, value) VALUES ({name}, {delta}) "
+            f"ON CONFLICT(name) DO UPDATE SET value = value + {delta};")
+
+_ORDER_STATUS_NEW = "'orders:' || COALESCE(NEW.status, '')"
+_ORDER_STATUS_OLD = "'orders:' || COALESCE(OLD.status, '')"
+
+STATS_SCHEMA = [
+    f"CREATE TRIGGER IF NOT EXISTS stats_user_insert AFTER INSERT ON user BEGIN {_bump(repr('users'), 1)} END",
+    f"CREATE TRIGGER IF NOT EXISTS stats_user_delete AFTER DELETE ON user BEGIN {_bump(repr('users'), -1)} END",
+    f"CREATE TRIGGER IF NOT EXISTS stats_product_insert AFTER INSERT ON product BEGIN {_bump(repr('products'), 1)} END",
+    f"CREATE TRIGGER IF NOT EXISTS stats_product_delete AFTER DELETE ON product BEGIN {_bump(repr('products'), -1)} END",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_order_insert AFTER INSERT ON "order" BEGIN
+        {_bump(repr('orders'), 1)}
+        {_bump(_ORDER_STATUS_NEW, 1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_order_delete AFTER DELETE ON "order" BEGIN
+        {_bump(repr('orders'), -1)}
+        {_bump(_ORDER_STATUS_OLD, -1)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_order_status AFTER UPDATE OF status ON "order"
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        {_bump(_ORDER_STATUS_OLD, -1)}
+        {_bump(_ORDER_STATUS_NEW, 1)}
+    END""",
+]
+
+def install():
+    """Создает триггеры; если счетчиков еще нет, считает их по текущим данным (без commit)"""
+    for statement in STATS_SCHEMA:
+        db.session.execute(text(statement))
+    if not db.session.query(StatCounter.name).first():
+        rebuild()
+
+def rebuild():
+    """Пересчитывает все счетчики полным проходом по таблицам"""
+    # Удаляем только свои счетчики: в stat_counter хранится и версия каталога
+    db.session.execute(text(
+        "DELETE FROM stat_counter WHERE name IN ('users', 'products', 'orders') OR name LIKE 'orders:%'"
+    ))
+    db.session.execute(text("""
+        INSERT INTO stat_counter(name, value)
+        SELECT 'users', COUNT(*) FROM user
+        UNION ALL SELECT 'products', COUNT(*) FROM product
+        UNION ALL SELECT 'orders', COUNT(*) FROM "order"
+        UNION ALL SELECT 'orders:' || COALESCE(status, ''), COUNT(*) FROM "order" GROUP BY status
+    """))
+
+def get_counts():
+    """Все счетчики одним запросом: словарь name -> value"""
+    return dict(db.session.query(StatCounter.name, StatCounter.value))
+
+def summary():
+    """Счетчики в виде, удобном для страниц и утилиты"""
+    counts = get_counts()
+    return {
+        'users': counts.get('users', 0),
+        'products': counts.get('products', 0),
+        'orders': counts.get('orders', 0),
+        'orders_unpaid': counts.get(f'orders:{STATUS_UNPAID}', 0),
+        'orders_paid': counts.get(f'orders:{STATUS_PAID}', 0),
+    }
@@ -0,0 +1,52 @@
+import threading
+import time
+from flask import g, session, current_app
+from models.models import db, User
+
+# Текущий пользователь: ORM-объект загружается не более одного раза за запрос
+# (хранится в g), а данные для шаблонов (логин, роль) дополнительно кэшируются
+# в памяти процесса на USER_CACHE_TTL секунд. Кэш сбрасывается при изменении
+# и удалении аккаунта и при выходе.
+
+MAX_ENTRIES = 10000
+
+_cache = {}
+_lock = threading.Lock()
+
+def current_user():
+    """ORM-объект текущего пользователя или None"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
+def current_user_info():
+    """Словарь id/username/role текущего пользователя или None"""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    
+    ttl = current_app.config.get('USER_CACHE_TTL', 0)
+    if ttl > 0:
+        with _lock:
+            entry = _cache.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+    
+    user = current_user()
+    if not user:
+        return None
+    info = {'id': user.id, 'username': user.username, 'role': user.role}
+    
+    if ttl > 0:
+        with _lock:
+            if len(_cache) >= MAX_ENTRIES:
+                _cache.clear()
+            _cache[user_id] = (time.monotonic() + ttl, info)
+    return info
+
+def invalidate(user_id):
+    """Сбрасывает кэшированные данные пользователя"""
+    with _lock:
+        _cache.pop(user_id, None)
+    g.pop('current_user', None)